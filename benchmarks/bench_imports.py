@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+'''Benchmarks loading each bundled fact module, and running its fact() for
+the first time, with the fake macOS backends in fakemac.
+
+Each module is loaded the way munki_facts.py loads it, in a fresh
+interpreter, so nothing it shares with other modules is already loaded. The
+PyObjC frameworks each module imports while loading, rather than while
+running, are listed too. Results can be saved with --json and compared with
+an earlier run with --compare.'''
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+FRAMEWORKS = ['CoreFoundation', 'Foundation', 'SystemConfiguration', 'objc']
+
+
+def child(config):
+    '''Loads a fact module and runs its fact() once with the fakes installed,
+    and prints how long each took as JSON'''
+    sys.path.insert(0, BENCH_DIR)
+    # pylint: disable=import-outside-toplevel
+    import fakemac
+    fakemac.CONFIG.update(config['fakemac'])
+    fakemac.install()
+    sys.path.insert(0, REPO_DIR)
+    import munki_facts
+    # pylint: enable=import-outside-toplevel
+    name = config['module']
+    start = time.perf_counter()
+    module = munki_facts.load_fact_module(
+        name, os.path.join(REPO_DIR, 'facts', name + '.py'))
+    import_seconds = time.perf_counter() - start
+    frameworks = [framework for framework in FRAMEWORKS
+                  if framework in sys.modules]
+    start = time.perf_counter()
+    module.fact()
+    fact_seconds = time.perf_counter() - start
+    print(json.dumps({'import_seconds': import_seconds,
+                      'fact_seconds': fact_seconds,
+                      'frameworks': frameworks}))
+
+
+def run_once(config):
+    '''Runs one repetition in a fresh interpreter and returns its results'''
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child',
+         json.dumps(config)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if proc.returncode:
+        raise SystemExit('Benchmark run failed:\n%s'
+                         % proc.stderr.decode('utf-8', 'replace'))
+    return json.loads(proc.stdout.decode('utf-8').strip().splitlines()[-1])
+
+
+def run_module(name, options):
+    '''Benchmarks a fact module options.repeat times and returns its
+    statistics'''
+    config = {
+        'module': name,
+        'fakemac': {
+            'command_latency': options.command_latency,
+            'iokit_latency': options.iokit_latency,
+            'import_latency': options.import_latency,
+        },
+    }
+    # the first run warms the OS's file caches and writes the bytecode
+    run_once(config)
+    runs = [run_once(config) for _ in range(options.repeat)]
+    return {
+        'import_median': statistics.median(
+            [run['import_seconds'] for run in runs]),
+        'fact_median': statistics.median(
+            [run['fact_seconds'] for run in runs]),
+        'frameworks': runs[-1]['frameworks'],
+    }
+
+
+def main():
+    '''Run the benchmarks'''
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument(
+        '--module', action='append',
+        help='Fact module to run; may be given more than once. Defaults to '
+        'all the bundled ones.')
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='Timed runs per module. Defaults to %(default)s.')
+    parser.add_argument(
+        '--import-latency', type=float, default=0.05,
+        help='Seconds importing each fake PyObjC framework takes. Defaults '
+        'to %(default)s.')
+    parser.add_argument(
+        '--iokit-latency', type=float, default=0.001,
+        help='Seconds each fake IORegistry read takes. Defaults to '
+        '%(default)s.')
+    parser.add_argument(
+        '--command-latency', type=float, default=0.0,
+        help='Seconds each fake tool takes. Defaults to %(default)s.')
+    parser.add_argument('--json', help='Save the results to this file')
+    parser.add_argument(
+        '--compare', help='Show the change from results saved with --json')
+    options = parser.parse_args()
+
+    if options.child:
+        child(json.loads(options.child))
+        return 0
+
+    if options.repeat < 1:
+        parser.error('--repeat must be 1 or greater')
+    names = options.module or sorted(
+        name[:-3] for name in os.listdir(os.path.join(REPO_DIR, 'facts'))
+        if name.endswith('.py') and not name.startswith('_'))
+    results = dict((name, run_module(name, options)) for name in names)
+
+    baseline = {}
+    if options.compare:
+        with open(options.compare) as file:
+            baseline = json.load(file).get('modules', {})
+    header = '%-28s %10s %10s' % ('module', 'import ms', 'fact ms')
+    if baseline:
+        header += ' %10s' % 'change'
+    print(header + '  imported while loading')
+    for name, result in results.items():
+        line = '%-28s %10.1f %10.1f' % (
+            name, result['import_median'] * 1000, result['fact_median'] * 1000)
+        if baseline:
+            before = baseline.get(name)
+            if before:
+                line += ' %+8.1fms' % (
+                    (result['import_median'] - before['import_median']) *
+                    1000)
+            else:
+                line += ' %10s' % ''
+        print(line + '  ' + (', '.join(result['frameworks']) or '-'))
+
+    if options.json:
+        with open(options.json, 'w') as file:
+            json.dump({'modules': results}, file, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+'''Benchmarks munki_facts.main() end to end on Linux (or a Mac) with the fake
+macOS backends in fakemac.
+
+Every repetition runs in a fresh interpreter against a throwaway copy of the
+conditions directory, and times one call to munki_facts.main(): finding the
+fact modules, loading and running them, and reading, merging and writing
+ConditionalItems.plist. Interpreter startup is not included.
+
+Scenarios cover the bundled fact modules with and without a warm cache,
+hundreds of synthetic fact modules, modules of very different run times, and
+a large existing ConditionalItems.plist. Results can be saved with --json and
+compared with an earlier run with --compare.'''
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import json
+import os
+import platform
+import plistlib
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import fakemac
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# name -> settings
+SCENARIOS = {
+    'bundled-cold': {
+        'bundled': True, 'cached': False,
+        'description': 'bundled fact modules, no cache'},
+    'bundled-warm': {
+        'bundled': True, 'cached': True,
+        'description': 'bundled fact modules, warm cache'},
+    'synthetic-100': {
+        'synthetic': 100, 'cached': False,
+        'description': '100 synthetic fact modules, no cache'},
+    'synthetic-500': {
+        'synthetic': 500, 'cached': False,
+        'description': '500 synthetic fact modules, no cache'},
+    'bundled-agent': {
+        'bundled': True, 'cached': False, 'agent': True,
+        'description': 'bundled fact modules run by a resident agent, no '
+                       'cache'},
+    'skewed': {
+        'sleepers': [0.05] * 16 + [0.4], 'cached': True,
+        'runner_args': ['--workers', '4'],
+        'description': '16 fact modules that take 50ms and one, last by '
+                       'name, that takes 400ms, on 4 workers'},
+    'skewed-budget': {
+        'sleepers': [0.05] * 16 + [0.4], 'cached': True,
+        'runner_args': ['--workers', '4', '--budget', '0.2'],
+        'description': 'as skewed, with --budget 0.2'},
+    'skewed-isolated': {
+        'sleepers': [0.05] * 16 + [0.4], 'cached': True,
+        'runner_args': ['--workers', '4', '--isolate'],
+        'description': 'as skewed, with each module in a worker process'},
+    'large-plist': {
+        'bundled': True, 'cached': False, 'plist_keys': 50000,
+        'description': 'bundled fact modules, 50,000 existing conditional '
+                       'items'},
+    'large-plist-binary': {
+        'bundled': True, 'cached': False, 'plist_keys': 50000,
+        'runner_args': ['--binary-plist'],
+        'description': 'bundled fact modules, 50,000 existing conditional '
+                       'items in a binary plist'},
+}
+
+# synthetic fact modules cycle through these
+SYNTHETIC_TEMPLATES = [
+    # pure Python
+    """def fact():
+    return {'synthetic_%(index)d': sum(range(1000))}
+""",
+    # a shared probe
+    """from facts import _probe
+
+
+def fact():
+    return {'synthetic_%(index)d': _probe.get_current_model()}
+""",
+    # an external tool
+    """from facts import _command
+
+
+def fact():
+    return {'synthetic_%(index)d':
+            _command.run(['/usr/bin/sw_vers', '-productVersion']).stdout}
+""",
+]
+
+# fact modules that just take a while
+SLEEPER_TEMPLATE = """import time
+
+
+def fact():
+    time.sleep(%(seconds)r)
+    return {'sleeper_%(index)d': True}
+"""
+
+
+def make_conditions_dir(work_dir, bundled=False, synthetic=0, sleepers=()):
+    '''Copies munki_facts.py and the shared fact code into work_dir, with the
+    bundled fact modules and/or synthetic ones, and a module that sleeps for
+    each of sleepers seconds. Returns the path of the copy.'''
+    conditions_dir = os.path.join(work_dir, 'conditions')
+    facts_dir = os.path.join(conditions_dir, 'facts')
+    os.makedirs(facts_dir)
+    shutil.copy(os.path.join(REPO_DIR, 'munki_facts.py'), conditions_dir)
+    for name in os.listdir(os.path.join(REPO_DIR, 'facts')):
+        path = os.path.join(REPO_DIR, 'facts', name)
+        if not os.path.isfile(path):
+            continue
+        if name.startswith('_') or (bundled and name.endswith('.py')):
+            shutil.copy(path, facts_dir)
+    for index in range(synthetic):
+        template = SYNTHETIC_TEMPLATES[index % len(SYNTHETIC_TEMPLATES)]
+        with open(os.path.join(facts_dir, 'synthetic_%04d.py' % index),
+                  'w') as file:
+            file.write(template % {'index': index})
+    for index, seconds in enumerate(sleepers):
+        with open(os.path.join(facts_dir, 'sleeper_%04d.py' % index),
+                  'w') as file:
+            file.write(SLEEPER_TEMPLATE % {'index': index, 'seconds': seconds})
+    return conditions_dir
+
+
+def make_conditional_items(path, count):
+    '''Writes a ConditionalItems.plist with count items'''
+    items = {}
+    for index in range(count):
+        kind = index % 3
+        if kind == 0:
+            items['existing_%d' % index] = 'value %d' % index
+        elif kind == 1:
+            items['existing_%d' % index] = index % 2 == 0
+        else:
+            items['existing_%d' % index] = ['a', 'b', str(index)]
+    with open(path, 'wb') as file:
+        plistlib.dump(items, file)
+
+
+def child(config):
+    '''Runs munki_facts.main() once with the fakes installed and prints how
+    long it took as JSON. If config asks for an agent, runs
+    munki_facts.main() as the agent until it is stopped.'''
+    fakemac.CONFIG.update(config['fakemac'])
+    fakemac.install()
+    sys.path.insert(0, config['conditions_dir'])
+    start = time.perf_counter()
+    import munki_facts  # pylint: disable=import-outside-toplevel
+    import_seconds = time.perf_counter() - start
+    sys.argv = ['munki_facts.py'] + config['runner_args']
+    if config.get('agent'):
+        sys.argv.append('--agent')
+        munki_facts.main()
+        return
+    start = time.perf_counter()
+    munki_facts.main()
+    seconds = time.perf_counter() - start
+    print(json.dumps({'seconds': seconds, 'import_seconds': import_seconds}))
+
+
+def run_once(config):
+    '''Runs one repetition in a fresh interpreter and returns its results'''
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child',
+         json.dumps(config)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if proc.returncode:
+        raise SystemExit('Benchmark run failed:\n%s'
+                         % proc.stderr.decode('utf-8', 'replace'))
+    result = json.loads(proc.stdout.decode('utf-8').strip().splitlines()[-1])
+    result['errors'] = len(proc.stderr.splitlines())
+    return result
+
+
+def start_agent(config, socket_path):
+    '''Starts a resident agent in a fresh interpreter and waits for it to
+    answer. Returns its Popen.'''
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--child',
+         json.dumps(dict(config, agent=True))],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            return proc
+        time.sleep(0.1)
+    proc.kill()
+    raise SystemExit('The agent didn\'t start')
+
+
+def run_scenario(name, options):
+    '''Runs a scenario options.repeat times and returns its statistics'''
+    settings = SCENARIOS[name]
+    work_dir = tempfile.mkdtemp(prefix='munki_facts_bench.')
+    try:
+        managed_install_dir = os.path.join(work_dir, 'Managed Installs')
+        os.makedirs(managed_install_dir)
+        if settings.get('plist_keys'):
+            make_conditional_items(
+                os.path.join(managed_install_dir, 'ConditionalItems.plist'),
+                settings['plist_keys'])
+        runner_args = ['--managed-install-dir', managed_install_dir] + list(
+            options.runner_args) + settings.get('runner_args', [])
+        if not settings.get('cached'):
+            runner_args.append('--no-cache')
+        socket_path = os.path.join(work_dir, 'agent.sock')
+        if settings.get('agent'):
+            runner_args += ['--socket', socket_path]
+        else:
+            runner_args.append('--no-agent')
+        config = {
+            'conditions_dir': make_conditions_dir(
+                work_dir, bundled=settings.get('bundled', False),
+                synthetic=settings.get('synthetic', 0),
+                sleepers=settings.get('sleepers', ())),
+            'runner_args': runner_args,
+            'fakemac': {
+                'managed_install_dir': managed_install_dir,
+                'cache_dir': os.path.join(work_dir, 'Caches'),
+                'command_latency': options.command_latency,
+                'iokit_latency': options.iokit_latency,
+                'sysctl_latency': options.sysctl_latency,
+                'import_latency': options.import_latency,
+                'virtual_machine': options.virtual_machine,
+            },
+        }
+        agent = None
+        if settings.get('agent'):
+            agent = start_agent(config, socket_path)
+        try:
+            # the first run warms the cache and the OS's file caches
+            run_once(config)
+            runs = [run_once(config) for _ in range(options.repeat)]
+        finally:
+            if agent:
+                agent.terminate()
+                agent.wait()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    seconds = [run['seconds'] for run in runs]
+    return {
+        'description': settings['description'],
+        'median': statistics.median(seconds),
+        'min': min(seconds),
+        'max': max(seconds),
+        'stdev': statistics.stdev(seconds) if len(seconds) > 1 else 0.0,
+        'import_median': statistics.median(
+            [run['import_seconds'] for run in runs]),
+        'stderr_lines': runs[-1]['errors'],
+    }
+
+
+def print_results(results, baseline=None):
+    '''Prints a table of results, with the change from baseline if given'''
+    header = '%-18s %10s %10s %10s %10s' % (
+        'scenario', 'median ms', 'min ms', 'max ms', 'stdev ms')
+    if baseline:
+        header += ' %10s' % 'change'
+    print(header)
+    for name, result in results.items():
+        line = '%-18s %10.1f %10.1f %10.1f %10.1f' % (
+            name, result['median'] * 1000, result['min'] * 1000,
+            result['max'] * 1000, result['stdev'] * 1000)
+        if baseline and name in baseline.get('scenarios', {}):
+            before = baseline['scenarios'][name]['median']
+            line += ' %+9.1f%%' % ((result['median'] - before) / before * 100)
+        print(line)
+
+
+def main():
+    '''Run the benchmarks'''
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument(
+        '--scenario', action='append', choices=sorted(SCENARIOS),
+        help='Scenario to run; may be given more than once. Defaults to all.')
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='Timed runs per scenario. Defaults to %(default)s.')
+    parser.add_argument(
+        '--command-latency', type=float, default=0.05,
+        help='Seconds each fake tool takes. Defaults to %(default)s.')
+    parser.add_argument(
+        '--iokit-latency', type=float, default=0.001,
+        help='Seconds each fake IORegistry read takes. Defaults to '
+        '%(default)s.')
+    parser.add_argument(
+        '--sysctl-latency', type=float, default=0.0001,
+        help='Seconds each fake sysctl takes. Defaults to %(default)s.')
+    parser.add_argument(
+        '--import-latency', type=float, default=0.0,
+        help='Seconds importing each fake PyObjC framework takes. Defaults '
+        'to %(default)s.')
+    parser.add_argument(
+        '--virtual-machine', choices=sorted(fakemac.VIRTUAL_MACHINES),
+        help='Pretend to be a VM from this vendor')
+    parser.add_argument(
+        '--runner-args', default='',
+        help='Extra arguments for munki_facts.py, e.g. "--workers 1"')
+    parser.add_argument('--json', help='Save the results to this file')
+    parser.add_argument(
+        '--compare', help='Show the change from results saved with --json')
+    options = parser.parse_args()
+
+    if options.child:
+        child(json.loads(options.child))
+        return 0
+
+    options.runner_args = options.runner_args.split()
+    if options.repeat < 1:
+        parser.error('--repeat must be 1 or greater')
+    results = {}
+    for name in options.scenario or sorted(SCENARIOS):
+        results[name] = run_scenario(name, options)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+
+    if options.json:
+        report = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'settings': dict((key, value)
+                             for key, value in vars(options).items()
+                             if key not in ('child', 'json', 'compare')),
+            'scenarios': results,
+        }
+        with open(options.json, 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+'''Benchmarks how long munki_facts.py takes to start: importing munki_facts
+and finding ManagedInstallDir in a fresh interpreter, with the fake macOS
+backends in fakemac.
+
+Each way of finding ManagedInstallDir is timed separately: the
+--managed-install-dir option, the environment, Munki's preferences files, and
+CFPreferences, which means importing CoreFoundation. With --importtime, the
+slowest imports of each, as reported by python -X importtime, are listed
+too.'''
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# how each mode finds ManagedInstallDir
+MODES = ['flag', 'environment', 'preferences', 'cfpreferences']
+
+
+def child(config):
+    '''Imports munki_facts and finds ManagedInstallDir once, and prints how
+    long that took as JSON'''
+    sys.path.insert(0, BENCH_DIR)
+    # pylint: disable=import-outside-toplevel
+    import fakemac
+    fakemac.CONFIG.update(config['fakemac'])
+    fakemac.install()
+    sys.path.insert(0, REPO_DIR)
+    start = time.perf_counter()
+    import munki_facts
+    # pylint: enable=import-outside-toplevel
+    import_seconds = time.perf_counter() - start
+    munki_facts.PREFERENCES_FILES = config['preferences_files']
+    path = None
+    if config['mode'] == 'flag':
+        path = config['managed_install_dir']
+    managed_install_dir = munki_facts.get_managed_install_dir(path)
+    seconds = time.perf_counter() - start
+    if managed_install_dir != config['managed_install_dir']:
+        raise SystemExit('Found %s, expected %s' % (
+            managed_install_dir, config['managed_install_dir']))
+    print(json.dumps({'seconds': seconds, 'import_seconds': import_seconds,
+                      'corefoundation': 'CoreFoundation' in sys.modules}))
+
+
+def parse_importtime(output):
+    '''Returns (cumulative microseconds, module) for each import in the
+    output of python -X importtime'''
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            cumulative = int(fields[1])
+        except (IndexError, ValueError):
+            # the header
+            continue
+        imports.append((cumulative, fields[2].rstrip()))
+    return imports
+
+
+def run_once(config, importtime=False):
+    '''Runs one repetition in a fresh interpreter and returns its results'''
+    env = dict(os.environ)
+    env.pop('MUNKI_FACTS_MANAGED_INSTALL_DIR', None)
+    if config['mode'] == 'environment':
+        env['MUNKI_FACTS_MANAGED_INSTALL_DIR'] = config['managed_install_dir']
+    argv = [sys.executable]
+    if importtime:
+        argv += ['-X', 'importtime']
+    argv += [os.path.abspath(__file__), '--child', json.dumps(config)]
+    proc = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          env=env, check=False)
+    stderr = proc.stderr.decode('utf-8', 'replace')
+    if proc.returncode:
+        raise SystemExit('Benchmark run failed:\n%s' % stderr)
+    result = json.loads(proc.stdout.decode('utf-8').strip().splitlines()[-1])
+    if importtime:
+        result['imports'] = parse_importtime(stderr)
+    return result
+
+
+def run_mode(mode, work_dir, options):
+    '''Runs a mode options.repeat times and returns its statistics'''
+    managed_install_dir = os.path.join(work_dir, 'Managed Installs')
+    preferences_files = [os.path.join(work_dir, 'missing.plist')]
+    if mode == 'preferences':
+        preferences_files.append(os.path.join(work_dir, 'prefs.plist'))
+    elif mode == 'cfpreferences':
+        preferences_files.append(os.path.join(work_dir, 'unreadable.plist'))
+    config = {
+        'mode': mode,
+        'managed_install_dir': managed_install_dir,
+        'preferences_files': preferences_files,
+        'fakemac': {
+            'managed_install_dir': managed_install_dir,
+            'import_latency': options.import_latency,
+        },
+    }
+    # the first run warms the OS's file caches and writes the bytecode
+    run_once(config)
+    runs = [run_once(config) for _ in range(options.repeat)]
+    result = {
+        'median': statistics.median([run['seconds'] for run in runs]),
+        'import_median': statistics.median(
+            [run['import_seconds'] for run in runs]),
+        'corefoundation': runs[-1]['corefoundation'],
+    }
+    if options.importtime:
+        result['imports'] = run_once(config, importtime=True)['imports']
+    return result
+
+
+def main():
+    '''Run the benchmarks'''
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument(
+        '--mode', action='append', choices=MODES,
+        help='Mode to run; may be given more than once. Defaults to all.')
+    parser.add_argument(
+        '--repeat', type=int, default=10,
+        help='Timed runs per mode. Defaults to %(default)s.')
+    parser.add_argument(
+        '--import-latency', type=float, default=0.05,
+        help='Seconds importing each fake PyObjC framework takes. Defaults '
+        'to %(default)s.')
+    parser.add_argument(
+        '--importtime', type=int, nargs='?', const=10, default=0,
+        metavar='N',
+        help='List the N slowest imports of each mode. N defaults to 10.')
+    options = parser.parse_args()
+
+    if options.child:
+        child(json.loads(options.child))
+        return 0
+
+    if options.repeat < 1:
+        parser.error('--repeat must be 1 or greater')
+    work_dir = tempfile.mkdtemp(prefix='munki_facts_bench.')
+    with open(os.path.join(work_dir, 'prefs.plist'), 'w') as file:
+        file.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<plist version="1.0"><dict><key>ManagedInstallDir</key>'
+            '<string>%s</string></dict></plist>\n'
+            % os.path.join(work_dir, 'Managed Installs'))
+    with open(os.path.join(work_dir, 'unreadable.plist'), 'w') as file:
+        file.write('not a plist')
+    try:
+        results = dict((mode, run_mode(mode, work_dir, options))
+                       for mode in options.mode or MODES)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print('%-14s %10s %10s %15s' % ('mode', 'total ms', 'import ms',
+                                    'CoreFoundation'))
+    for mode, result in results.items():
+        print('%-14s %10.1f %10.1f %15s' % (
+            mode, result['median'] * 1000, result['import_median'] * 1000,
+            'imported' if result['corefoundation'] else 'not imported'))
+    if options.importtime:
+        for mode, result in results.items():
+            print('\nSlowest imports, %s:' % mode)
+            for cumulative, module in sorted(
+                    result['imports'], reverse=True)[:options.importtime]:
+                print('%10.1f ms  %s' % (cumulative / 1000.0, module))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+'''Benchmarks parsing system_profiler's XML output: plistlib against the
+streaming parser in facts/_system_profiler.py, which keeps only the item keys
+it is asked for.
+
+By default it parses synthetic reports of several sizes, shaped like
+SPApplicationsDataType. Captured output, from system_profiler -xml DATATYPE >
+FILE, can be parsed instead with --input. Time is measured without
+tracemalloc and peak memory with it, in separate passes.
+
+plistlib and the streaming parser are given the whole report in memory, and
+its size is counted in their peak memory. fetch runs a stand-in for
+system_profiler that writes the report to a pipe, as _system_profiler.fetch()
+reads it, so the report is never held in memory at all.'''
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import datetime
+import os
+import plistlib
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+# pylint: disable=wrong-import-position
+from facts import _system_profiler
+# pylint: enable=wrong-import-position
+
+# items in each synthetic report
+SIZES = [1000, 10000, 50000]
+
+
+def make_report(count):
+    '''Returns system_profiler style XML with count items'''
+    items = []
+    for index in range(count):
+        items.append({
+            '_name': 'Application %d' % index,
+            'version': '%d.%d.%d' % (index % 20, index % 7, index % 3),
+            'lastModified': datetime.datetime(2024, 1, 1 + index % 28),
+            'obtained_from': 'identified_developer',
+            'path': '/Applications/Application %d.app' % index,
+            'signed_by': ['Developer ID Application: Example (ABCDE12345)',
+                          'Developer ID Certification Authority',
+                          'Apple Root CA'],
+            'arch_kind': 'arch_arm_i64',
+        })
+    return plistlib.dumps([{
+        '_dataType': 'SPApplicationsDataType',
+        '_detailLevel': 1,
+        '_items': items,
+        '_parentDataType': 'SPSoftwareDataType',
+        '_properties': {'_name': {'_isColumn': True, '_order': '0'}},
+    }])
+
+
+def plistlib_parse(output, keys):
+    '''Parses output with plistlib, then keeps the wanted keys'''
+    reports = plistlib.loads(output)
+    return dict((report['_dataType'],
+                 [dict((key, item[key]) for key in keys if key in item)
+                  for item in report.get('_items', [])])
+                for report in reports)
+
+
+def streaming_parse(output, keys):
+    '''Parses output with the streaming parser'''
+    return _system_profiler.parse_report(output, keys)
+
+
+def make_fetch(work_dir, output):
+    '''Returns a function that parses output with _system_profiler.fetch(),
+    reading it from a pipe'''
+    report_path = os.path.join(work_dir, 'report.xml')
+    with open(report_path, 'wb') as file:
+        file.write(output)
+    tool_path = os.path.join(work_dir, 'system_profiler')
+    with open(tool_path, 'w') as file:
+        file.write('#!/bin/sh\nexec cat "%s"\n' % report_path)
+    os.chmod(tool_path, 0o755)
+
+    def fetch(_output, keys):
+        '''Parses the report as system_profiler's output'''
+        _system_profiler.SYSTEM_PROFILER = tool_path
+        return _system_profiler.fetch(['SPApplicationsDataType'], keys)
+    return fetch
+
+
+def measure(parse, output, keys, repeat, in_memory):
+    '''Returns the median seconds and the peak bytes allocated by parse,
+    including the report itself if in_memory is True'''
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(output, keys)
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    parse(output, keys)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    if in_memory:
+        peak += len(output)
+    return statistics.median(seconds), peak
+
+
+def main():
+    '''Run the benchmarks'''
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '--input', action='append',
+        help='system_profiler -xml output to parse; may be given more than '
+        'once. Defaults to synthetic reports.')
+    parser.add_argument(
+        '--keys', default='version,path',
+        help='Comma separated item keys to keep. Defaults to %(default)s.')
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='Timed runs per report. Defaults to %(default)s.')
+    options = parser.parse_args()
+    if options.repeat < 1:
+        parser.error('--repeat must be 1 or greater')
+    keys = options.keys.split(',')
+
+    reports = []
+    for path in options.input or []:
+        with open(path, 'rb') as file:
+            reports.append((os.path.basename(path), file.read()))
+    if not options.input:
+        reports = [('%d items' % size, make_report(size)) for size in SIZES]
+
+    print('%-16s %8s  %-10s %10s %10s' % (
+        'report', 'MB', 'parser', 'median ms', 'peak MB'))
+    work_dir = tempfile.mkdtemp()
+    try:
+        for name, output in reports:
+            for parser_name, parse, in_memory in (
+                    ('plistlib', plistlib_parse, True),
+                    ('streaming', streaming_parse, True),
+                    ('fetch', make_fetch(work_dir, output), False)):
+                seconds, peak = measure(parse, output, keys, options.repeat,
+                                        in_memory)
+                print('%-16s %8.1f  %-10s %10.1f %10.1f' % (
+                    name, len(output) / 1e6, parser_name, seconds * 1000,
+                    peak / 1e6))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+'''Checks how munki_facts.py behaves, on Linux (or a Mac), with the fake
+macOS backends in fakemac.
+
+Each check writes small fact modules into a throwaway copy of the conditions
+directory and runs munki_facts.py against it one or more times, each in a
+fresh interpreter. It then looks at ConditionalItems.plist, FactsCache.plist
+and a log of the fact modules that ran. The checks cover:
+  - the bundled fact modules
+  - the order DEPENDS runs modules in, and a failed dependency
+  - reusing results by CACHE_TTL and INPUTS
+  - skipping a failing module, and trying it again once it changes
+  - --budget, with and without DEPENDS
+  - two runs at once sharing one collection
+
+Exits with status 1 if any check fails.'''
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import json
+import os
+import plistlib
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import bench_runner
+import fakemac
+
+# every check module appends its name to the log when it runs; a module
+# fails if a file named after it with .fail is in the log directory
+MODULE_TEMPLATE = """import os
+import time
+
+DEPENDS = %(depends)r
+%(settings)s
+LOG_DIR = %(log_dir)r
+
+
+def fact(**depends):
+    time.sleep(%(seconds)r)
+    with open(os.path.join(LOG_DIR, 'ran.log'), 'a') as file:
+        file.write(%(name)r + '\\n')
+    if os.path.exists(os.path.join(LOG_DIR, %(name)r + '.fail')):
+        raise RuntimeError('%(name)s was told to fail')
+    return {%(name)r: %(value)s}
+"""
+
+# a module's value is the number of times it has run, plus ten times the
+# value of each module it depends on, so a value says which results it saw
+VALUE = ("len([line for line in open(os.path.join(LOG_DIR, 'ran.log')) "
+         "if line.strip() == %(name)r]) + "
+         "sum(10 * value[name] for name, value in depends.items())")
+
+# name -> (description, function); filled in by @check
+CHECKS = {}
+
+
+class CheckFailed(Exception):
+    '''Raised by a check when munki_facts.py didn't do what it should'''
+
+
+def check(description):
+    '''Registers the decorated function as a check'''
+    def register(function):
+        CHECKS[function.__name__.replace('check_', '')] = (description,
+                                                           function)
+        return function
+    return register
+
+
+def expect(condition, message, *args):
+    '''Raises CheckFailed with message % args unless condition is true'''
+    if not condition:
+        raise CheckFailed(message % args)
+
+
+class Conditions(object):
+    '''A throwaway conditions directory and ManagedInstallDir to run
+    munki_facts.py in'''
+
+    def __init__(self, work_dir, bundled=False):
+        self.log_dir = os.path.join(work_dir, 'log')
+        os.makedirs(self.log_dir)
+        self.managed_install_dir = os.path.join(work_dir, 'Managed Installs')
+        os.makedirs(self.managed_install_dir)
+        self.conditions_dir = bench_runner.make_conditions_dir(
+            work_dir, bundled=bundled)
+        self.fakemac = {'managed_install_dir': self.managed_install_dir,
+                        'cache_dir': os.path.join(work_dir, 'Caches')}
+
+    def add_module(self, name, depends=(), seconds=0.0, **settings):
+        '''Writes fact module name, which sleeps for seconds, with DEPENDS
+        and any other module-level settings given'''
+        source = MODULE_TEMPLATE % {
+            'name': name, 'depends': list(depends), 'seconds': seconds,
+            'log_dir': self.log_dir, 'value': VALUE % {'name': name},
+            'settings': ''.join('%s = %r\n' % item
+                                for item in sorted(settings.items()))}
+        path = os.path.join(self.conditions_dir, 'facts', name + '.py')
+        # a file modified within a second of a run isn't trusted to look
+        # changed, so date every version of it further back than that
+        mtime = time.time() - 10
+        if os.path.exists(path):
+            mtime = os.stat(path).st_mtime - 10
+        with open(path, 'w') as file:
+            file.write(source)
+        os.utime(path, (mtime, mtime))
+
+    def set_failing(self, name, failing=True):
+        '''Makes fact module name fail, or stop failing'''
+        path = os.path.join(self.log_dir, name + '.fail')
+        if failing:
+            open(path, 'w').close()
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def start(self, *args):
+        '''Starts munki_facts.py with args and returns its Popen'''
+        config = {'conditions_dir': self.conditions_dir,
+                  'fakemac': self.fakemac,
+                  'runner_args': ['--managed-install-dir',
+                                  self.managed_install_dir,
+                                  '--no-agent'] + list(args)}
+        return subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--child',
+             json.dumps(config)],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def run(self, *args):
+        '''Runs munki_facts.py with args and returns what it printed on
+        stderr'''
+        proc = self.start(*args)
+        _, stderr = proc.communicate()
+        stderr = stderr.decode('utf-8', 'replace')
+        expect(proc.returncode == 0, 'munki_facts.py failed:\n%s', stderr)
+        return stderr
+
+    def ran(self, name=None):
+        '''Returns the names of the fact modules run so far, in the order
+        they ran, or how many times module name has run'''
+        try:
+            with open(os.path.join(self.log_dir, 'ran.log')) as file:
+                names = file.read().split()
+        except (IOError, OSError):
+            names = []
+        if name is None:
+            return names
+        return names.count(name)
+
+    def facts(self):
+        '''Returns the contents of ConditionalItems.plist'''
+        with open(os.path.join(self.managed_install_dir,
+                               'ConditionalItems.plist'), 'rb') as file:
+            return plistlib.load(file)
+
+    def failures(self):
+        '''Returns the record of failing modules in FactsCache.plist'''
+        with open(os.path.join(self.managed_install_dir,
+                               'FactsCache.plist'), 'rb') as file:
+            return plistlib.load(file).get('failures', {})
+
+
+@check('the bundled fact modules run without errors')
+def check_bundled(work_dir):
+    '''Runs the bundled fact modules against the fakes'''
+    conditions = Conditions(work_dir, bundled=True)
+    stderr = conditions.run('--no-cache')
+    expect(not stderr, 'Errors from the bundled modules:\n%s', stderr)
+    facts = conditions.facts()
+    for name in ('physical_or_virtual', 'sip_status', 'filevault_status'):
+        expect(name in facts, '%s is missing from %s', name, sorted(facts))
+
+
+@check('DEPENDS runs modules in order and skips those whose dependency '
+       'failed')
+def check_depends(work_dir):
+    '''Runs a chain of three modules, then fails the first'''
+    conditions = Conditions(work_dir)
+    conditions.add_module('base', seconds=0.2)
+    conditions.add_module('middle', depends=['base'])
+    conditions.add_module('top', depends=['middle'])
+    conditions.run()
+    expect(conditions.ran() == ['base', 'middle', 'top'],
+           'Modules ran in the order %s', conditions.ran())
+    facts = conditions.facts()
+    expect((facts['base'], facts['middle'], facts['top']) == (1, 11, 111),
+           'top, middle and base were %s, %s and %s, not 111, 11 and 1',
+           facts['top'], facts['middle'], facts['base'])
+
+    conditions.set_failing('base')
+    stderr = conditions.run()
+    expect(conditions.ran('middle') == 1 and conditions.ran('top') == 1,
+           'Modules ran after their dependency failed: %s', conditions.ran())
+    expect('base' in stderr, 'The failure of base wasn\'t reported:\n%s',
+           stderr)
+    failures = conditions.failures()
+    expect('base' in failures, 'The failure of base wasn\'t recorded')
+    expect('middle' not in failures and 'top' not in failures,
+           'Failures recorded against dependents of base: %s',
+           sorted(failures))
+
+
+@check('CACHE_TTL and INPUTS reuse results until they expire or change')
+def check_cache(work_dir):
+    '''Runs a module with a CACHE_TTL and one with INPUTS three times'''
+    conditions = Conditions(work_dir)
+    input_path = os.path.join(work_dir, 'input')
+    with open(input_path, 'w') as file:
+        file.write('one')
+    os.utime(input_path, (time.time() - 10, time.time() - 10))
+    conditions.add_module('with_ttl', CACHE_TTL=3600)
+    conditions.add_module('with_inputs', INPUTS=[input_path])
+    conditions.add_module('uncached')
+    conditions.run()
+    conditions.run()
+    expect(conditions.ran('uncached') == 2,
+           'A module without CACHE_TTL or INPUTS ran %d times in 2 runs',
+           conditions.ran('uncached'))
+    for name in ('with_ttl', 'with_inputs'):
+        expect(conditions.ran(name) == 1,
+               'Cached module %s ran %d times in 2 runs', name,
+               conditions.ran(name))
+        expect(conditions.facts().get(name) == 1,
+               'The cached result of %s wasn\'t used', name)
+
+    with open(input_path, 'w') as file:
+        file.write('two, a different size')
+    os.utime(input_path, (time.time() - 5, time.time() - 5))
+    conditions.run('--no-cache')
+    conditions.run()
+    expect(conditions.ran('with_inputs') == 3,
+           'with_inputs ran %d times, not once after its input changed and '
+           'once with --no-cache', conditions.ran('with_inputs'))
+    expect(conditions.facts()['with_inputs'] == 3,
+           'with_inputs was %r after its input changed, not 3',
+           conditions.facts()['with_inputs'])
+
+
+@check('a module that keeps failing is skipped until its file changes')
+def check_circuit(work_dir):
+    '''Fails a module more than FAILURE_THRESHOLD runs in a row, then fixes
+    it'''
+    conditions = Conditions(work_dir)
+    conditions.add_module('flaky')
+    conditions.run()
+    conditions.set_failing('flaky')
+    for _ in range(4):
+        conditions.run()
+    expect(conditions.ran('flaky') == 4,
+           'flaky ran %d times, not 4: once, then failing three times in a '
+           'row before being skipped', conditions.ran('flaky'))
+    expect(conditions.failures().get('flaky', {}).get('count') == 3,
+           'The failures of flaky were recorded as %r',
+           conditions.failures().get('flaky'))
+    expect(conditions.facts().get('flaky') == 1,
+           'The last good result of flaky wasn\'t kept while it was skipped')
+
+    # a fixed version is deployed
+    conditions.set_failing('flaky', False)
+    conditions.add_module('flaky', FIXED=True)
+    conditions.run()
+    expect(conditions.ran('flaky') == 5,
+           'flaky wasn\'t run again once its file changed')
+    expect('flaky' not in conditions.failures(),
+           'The failures of flaky weren\'t cleared once it succeeded')
+    expect(conditions.facts().get('flaky') == 5,
+           'flaky was %r once fixed, not 5', conditions.facts().get('flaky'))
+
+
+@check('--budget runs what fits and keeps earlier results for the rest')
+def check_budget(work_dir):
+    '''Runs a quick module and a slow one within a budget only the quick one
+    fits in'''
+    conditions = Conditions(work_dir)
+    conditions.add_module('quick')
+    conditions.add_module('slow', seconds=2)
+    conditions.run()
+    started = time.time()
+    conditions.run('--budget', '1')
+    seconds = time.time() - started
+    expect(conditions.ran('quick') == 2,
+           'quick ran %d times, not twice', conditions.ran('quick'))
+    expect(conditions.ran('slow') == 1,
+           'slow was run although it doesn\'t fit in the budget')
+    facts = conditions.facts()
+    expect((facts.get('quick'), facts.get('slow')) == (2, 1),
+           'quick and slow were %r and %r, not 2 and 1', facts.get('quick'),
+           facts.get('slow'))
+    # the interpreter has to start as well as run the modules
+    expect(seconds < 2, 'The run took %.1f seconds', seconds)
+
+
+@check('--budget gives modules their dependencies\' new results, not earlier '
+       'ones')
+def check_budget_depends(work_dir):
+    '''Runs a module and one that depends on it under --budget, then fails
+    the first'''
+    conditions = Conditions(work_dir)
+    conditions.add_module('base')
+    conditions.add_module('derived', depends=['base'])
+    conditions.run()
+    conditions.run('--budget', '20')
+    facts = conditions.facts()
+    expect((facts['base'], facts['derived']) == (2, 22),
+           'base and derived were %s and %s, not 2 and 22: derived was given '
+           'the earlier result of base', facts['base'], facts['derived'])
+
+    conditions.set_failing('base')
+    conditions.run('--budget', '20')
+    expect(conditions.ran('derived') == 2,
+           'derived ran with the earlier result of base after base failed')
+    facts = conditions.facts()
+    expect((facts['base'], facts['derived']) == (2, 22),
+           'base and derived were %s and %s, not their earlier results 2 and '
+           '22', facts['base'], facts['derived'])
+
+
+@check('two runs at once share one collection')
+def check_overlap(work_dir):
+    '''Starts two runs at once with a module that takes a second'''
+    conditions = Conditions(work_dir)
+    conditions.add_module('slow', seconds=1)
+    procs = [conditions.start(), conditions.start()]
+    for proc in procs:
+        _, stderr = proc.communicate()
+        expect(proc.returncode == 0, 'munki_facts.py failed:\n%s',
+               stderr.decode('utf-8', 'replace'))
+    expect(conditions.ran('slow') == 1,
+           'slow ran %d times for two overlapping runs',
+           conditions.ran('slow'))
+    expect(conditions.facts().get('slow') == 1,
+           'ConditionalItems.plist has %r', conditions.facts())
+
+
+def child(config):
+    '''Runs munki_facts.main() with the fakes installed'''
+    fakemac.CONFIG.update(config['fakemac'])
+    fakemac.install()
+    sys.path.insert(0, config['conditions_dir'])
+    import munki_facts  # pylint: disable=import-outside-toplevel
+    sys.argv = ['munki_facts.py'] + config['runner_args']
+    return munki_facts.main()
+
+
+def main():
+    '''Run the checks'''
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument(
+        '--check', action='append', choices=sorted(CHECKS),
+        help='Check to run; may be given more than once. Defaults to all.')
+    options = parser.parse_args()
+
+    if options.child:
+        return child(json.loads(options.child))
+
+    names = options.check or sorted(CHECKS)
+    failed = 0
+    for name in names:
+        description, function = CHECKS[name]
+        work_dir = tempfile.mkdtemp(prefix='munki_facts_check.')
+        try:
+            function(work_dir)
+        except CheckFailed as err:
+            failed += 1
+            print('FAIL %s: %s\n     %s' % (name, description, err))
+        else:
+            print('ok   %s: %s' % (name, description))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if failed:
+        print('%d of %d checks failed' % (failed, len(names)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
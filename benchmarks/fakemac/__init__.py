@@ -0,0 +1,228 @@
+'''Fake macOS backends, so munki_facts.py and the bundled fact modules can run
+on Linux.
+
+install() replaces, for the current process:
+  - the CoreFoundation, Foundation, objc and SystemConfiguration PyObjC
+    modules, with the fakes in the frameworks directory
+  - sysctlbyname() in the C library loaded through ctypes
+  - the /usr/bin and /usr/sbin tools fact modules run, with shell commands
+    that print canned output
+  - the admin group, /Users, platform.mac_ver() and os.uname()
+
+Every fake can be given a latency so runs take roughly as long as they would
+on a Mac. The values they return are in CONFIG, SYSCTL, IOREGISTRY and
+TOOLS, and can be changed before calling install(). Setting
+CONFIG['virtual_machine'] makes the fakes look like a VM from one of the
+vendors in VIRTUAL_MACHINES.'''
+
+from __future__ import absolute_import, print_function
+
+import ctypes
+import ctypes.util
+import grp
+import os
+import platform
+import plistlib
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+FRAMEWORKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'frameworks')
+
+CONFIG = {
+    # seconds to add to importing each fake PyObjC module
+    'import_latency': 0.0,
+    # seconds to add to each IORegistry property read and sysctl call
+    'iokit_latency': 0.0,
+    'sysctl_latency': 0.0,
+    # seconds each fake tool takes, unless TOOLS gives its own
+    'command_latency': 0.0,
+    'managed_install_dir': None,
+    # where facts/_system_profiler.py caches its data between runs
+    'cache_dir': None,
+    # None for a physical Mac, or a key of VIRTUAL_MACHINES
+    'virtual_machine': None,
+    'macos_version': '14.5',
+    'darwin_release': '23.5.0',
+    'admin_users': ['admin', 'localadmin'],
+    'user_dirs': ['Shared', 'alice', 'bob'],
+}
+
+IOREGISTRY = {
+    'model': b'MacBookPro16,1\0',
+    'board-id': b'Mac-E1008331FDC96864\0',
+    'manufacturer': b'Apple Inc.\0',
+}
+
+SYSCTL = {
+    'kern.hv_vmm_present': 0,
+    'machdep.cpu.features': 'FPU VME DE PSE TSC MSR PAE MCE CX8 APIC SEP',
+    'hw.model': 'MacBookPro16,1',
+    'hw.target': 'J152FAP',
+    'kern.boottime': struct.pack('<qq', 1700000000, 0),
+}
+
+# what the IORegistry says about the platform in a VM from each vendor
+VIRTUAL_MACHINES = {
+    'vmware': {'model': b'VMware7,1\0', 'manufacturer': b'VMware, Inc.\0'},
+    'parallels': {'model': b'Parallels-ARM\0',
+                  'manufacturer': b'Parallels International GmbH.\0'},
+    'virtualbox': {'model': b'VirtualBox\0',
+                   'manufacturer': b'innotek GmbH\0'},
+    # Apple's Virtualization framework names no vendor
+    'apple': {'model': b'VirtualMac2,1\0', 'manufacturer': b'Apple Inc.\0'},
+}
+
+SYSTEM_PROFILER_OUTPUT = plistlib.dumps([
+    {'_dataType': 'SPEthernetDataType',
+     '_items': [{'_name': 'en0', 'spethernet_vendor-id': '0x14e4'}]},
+    {'_dataType': 'SPHardwareDataType',
+     '_items': [{'_name': 'hardware_overview',
+                 'boot_rom_version': '2020.41.1.0.0',
+                 'machine_model': 'MacBookPro16,1'}]},
+])
+
+# path -> output, or (output, latency)
+TOOLS = {
+    '/usr/bin/fdesetup': b'FileVault is On.\n',
+    '/usr/bin/csrutil': b'System Integrity Protection status: enabled.\n',
+    '/usr/sbin/spctl': b'assessments enabled\n',
+    '/usr/bin/sw_vers': b'14.5\n',
+    '/usr/sbin/system_profiler': SYSTEM_PROFILER_OUTPUT,
+}
+
+_installed = {}
+
+
+def sleep(seconds):
+    '''Sleeps if seconds is more than 0'''
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+class FakeLibc(object):
+    '''Stands in for the C library; only sysctlbyname() is faked'''
+
+    def __init__(self, real):
+        self._real = real
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+    @staticmethod
+    # pylint: disable=unused-argument
+    def sysctlbyname(name, buf, size_ref, newp, newlen):
+        '''Copies the fake value of name into buf like sysctlbyname(3)'''
+        sleep(CONFIG['sysctl_latency'])
+        value = SYSCTL.get(name.decode('utf-8'))
+        if value is None:
+            data = b''
+        elif isinstance(value, bool) or isinstance(value, int):
+            data = struct.pack('<i', int(value))
+        elif isinstance(value, str):
+            data = value.encode('utf-8') + b'\0'
+        else:
+            data = value
+        size = size_ref._obj  # pylint: disable=protected-access
+        if buf is not None:
+            ctypes.memmove(buf, data, min(len(data), size.value))
+        size.value = len(data)
+        return -1 if value is None else 0
+    # pylint: enable=unused-argument
+
+
+def _fake_cdll(real_cdll, libc_name):
+    '''Returns a CDLL replacement that hands out a FakeLibc for the C
+    library'''
+    def cdll(name, *args, **kwargs):
+        library = real_cdll(name, *args, **kwargs)
+        if name == libc_name:
+            return FakeLibc(library)
+        return library
+    return cdll
+
+
+def _tool_command(args, output_dir):
+    '''Returns a shell command that behaves like the fake tool args[0]'''
+    tool = TOOLS[args[0]]
+    if isinstance(tool, tuple):
+        output, latency = tool
+    else:
+        output, latency = tool, CONFIG['command_latency']
+    output_path = os.path.join(output_dir,
+                               args[0].strip('/').replace('/', '_'))
+    if not os.path.exists(output_path):
+        with open(output_path, 'wb') as file:
+            file.write(output)
+    script = 'cat "$1"'
+    if latency > 0:
+        script = 'sleep %s; cat "$1"' % latency
+    return ['/bin/sh', '-c', script, args[0], output_path]
+
+
+def _fake_popen_init(real_init, output_dir):
+    '''Returns a Popen.__init__ that runs fake tools in place of real ones'''
+    def init(self, args, *more_args, **kwargs):
+        if isinstance(args, (list, tuple)) and args and args[0] in TOOLS:
+            args = _tool_command(list(args), output_dir)
+        real_init(self, args, *more_args, **kwargs)
+    return init
+
+
+def _fake_listdir(real_listdir, users_dir):
+    '''Returns an os.listdir that lists users_dir in place of /Users'''
+    def listdir(path='.'):
+        if path == '/Users':
+            path = users_dir
+        return real_listdir(path)
+    return listdir
+
+
+def install():
+    '''Installs the fakes in this process. Call it before importing
+    munki_facts or any fact module.'''
+    if _installed:
+        return
+    work_dir = tempfile.mkdtemp(prefix='fakemac.')
+    users_dir = os.path.join(work_dir, 'Users')
+    for name in CONFIG['user_dirs']:
+        os.makedirs(os.path.join(users_dir, name))
+    if not CONFIG['managed_install_dir']:
+        CONFIG['managed_install_dir'] = os.path.join(work_dir,
+                                                     'Managed Installs')
+    if not os.path.isdir(CONFIG['managed_install_dir']):
+        os.makedirs(CONFIG['managed_install_dir'])
+    if not CONFIG['cache_dir']:
+        CONFIG['cache_dir'] = os.path.join(work_dir, 'Caches')
+    os.environ['MUNKI_FACTS_CACHE_DIR'] = CONFIG['cache_dir']
+    if CONFIG['virtual_machine']:
+        IOREGISTRY.update(VIRTUAL_MACHINES[CONFIG['virtual_machine']])
+        SYSCTL['kern.hv_vmm_present'] = 1
+        SYSCTL['machdep.cpu.features'] += ' VMM'
+
+    _installed.update(work_dir=work_dir, cdll=ctypes.CDLL,
+                      popen_init=subprocess.Popen.__init__)
+    sys.path.insert(0, FRAMEWORKS_DIR)
+    ctypes.CDLL = _fake_cdll(ctypes.CDLL, ctypes.util.find_library('c'))
+    subprocess.Popen.__init__ = _fake_popen_init(
+        subprocess.Popen.__init__, os.path.join(work_dir, 'tools'))
+    os.makedirs(os.path.join(work_dir, 'tools'))
+    os.listdir = _fake_listdir(os.listdir, users_dir)
+
+    real_getgrgid = grp.getgrgid
+
+    def getgrgid(gid):
+        if gid == 80:
+            return grp.struct_group(('admin', '*', 80, CONFIG['admin_users']))
+        return real_getgrgid(gid)
+    grp.getgrgid = getgrgid
+
+    platform.mac_ver = lambda *args: (CONFIG['macos_version'], ('', '', ''),
+                                      'x86_64')
+    real_uname = os.uname()
+    os.uname = lambda: os.uname_result((
+        'Darwin', real_uname.nodename, CONFIG['darwin_release'],
+        'Darwin Kernel Version %s' % CONFIG['darwin_release'], 'x86_64'))
@@ -0,0 +1,12 @@
+'''Fake CoreFoundation for running munki_facts on Linux'''
+
+import fakemac
+
+fakemac.sleep(fakemac.CONFIG['import_latency'])
+
+
+def CFPreferencesCopyAppValue(key, domain):  # pylint: disable=invalid-name
+    '''Returns the fake ManagedInstallDir'''
+    if (key, domain) == ('ManagedInstallDir', 'ManagedInstalls'):
+        return fakemac.CONFIG['managed_install_dir']
+    return None
@@ -0,0 +1,31 @@
+'''Fake Foundation for running fact modules on Linux'''
+
+import fakemac
+
+fakemac.sleep(fakemac.CONFIG['import_latency'])
+
+NSUTF8StringEncoding = 4
+
+
+class NSBundle(object):
+    '''Fake NSBundle'''
+
+    @staticmethod
+    def bundleWithIdentifier_(identifier):  # pylint: disable=invalid-name
+        '''Returns a fake bundle'''
+        return identifier
+
+
+class NSString(str):
+    '''Fake NSString'''
+
+    @classmethod
+    def alloc(cls):
+        '''Returns a placeholder to call initWithData_encoding_ on'''
+        return cls()
+
+    # pylint: disable=invalid-name,no-self-use,unused-argument
+    def initWithData_encoding_(self, data, encoding):
+        '''Decodes data'''
+        return NSString(bytes(data).decode('utf-8'))
+    # pylint: enable=invalid-name,no-self-use,unused-argument
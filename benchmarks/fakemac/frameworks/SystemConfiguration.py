@@ -0,0 +1,12 @@
+'''Fake SystemConfiguration for running fact modules on Linux'''
+
+import fakemac
+
+fakemac.sleep(fakemac.CONFIG['import_latency'])
+
+
+# pylint: disable=invalid-name,unused-argument
+def SCDynamicStoreCopyValue(store, key):
+    '''Returns None, as if nothing is configured'''
+    return None
+# pylint: enable=invalid-name,unused-argument
@@ -0,0 +1,32 @@
+'''Fake objc for running fact modules on Linux. loadBundleFunctions() provides
+fake IOKit functions that read fakemac.IOREGISTRY.'''
+
+import fakemac
+
+fakemac.sleep(fakemac.CONFIG['import_latency'])
+
+
+# pylint: disable=invalid-name,unused-argument
+def IOServiceMatching(name):
+    '''Returns a fake matching dictionary'''
+    return {'IOProviderClass': name}
+
+
+def IOServiceGetMatchingService(port, matching):
+    '''Returns a fake service handle'''
+    fakemac.sleep(fakemac.CONFIG['iokit_latency'])
+    return 1
+
+
+def IORegistryEntryCreateCFProperty(entry, key, allocator, options):
+    '''Returns a fake IORegistry property'''
+    fakemac.sleep(fakemac.CONFIG['iokit_latency'])
+    return fakemac.IOREGISTRY.get(key)
+# pylint: enable=invalid-name,unused-argument
+
+
+def loadBundleFunctions(bundle, module_globals, functions):
+    '''Puts the fake IOKit functions named in functions into
+    module_globals'''
+    for name, _ in functions:
+        module_globals[name] = globals()[name]
@@ -0,0 +1,401 @@
+'''Runs external commands for fact modules.
+
+Every command runs on one asyncio event loop on a background thread, so the
+commands of all the fact modules overlap, with at most MAX_RUNNING running at
+once. A fact module can run a command with run(), or declare the commands it
+needs in a module-level COMMANDS dict and take them as an argument to fact();
+munki_facts.py then starts them all at once:
+
+    COMMANDS = {'status': ['/usr/bin/fdesetup', 'status']}
+
+    def fact(commands=None):
+        if commands is None:
+            commands = _command.run_commands(COMMANDS)
+        try:
+            stdout = commands['status'].stdout
+        except (IOError, OSError):
+            stdout = 'Unknown'
+
+Fact modules often need the same tool, so a command is only run once per run
+of munki_facts.py: anyone who asks for the same argv and environment while it
+is running, or after it has finished, gets the same result. Commands that
+fail, time out or are killed aren't shared once they have finished. Use
+shared=False for a command whose output changes from one moment to the next.
+
+Commands are tracked by the fact modules that want them, so munki_facts.py
+can kill them if those modules run past their deadline, and can report the
+CPU time and memory they used. Each command gets its own process group so
+anything it starts is killed too.
+
+asyncio takes longer to import than munki_facts.py and everything else it
+imports together, and a run served from the cache doesn't run any commands,
+so it is only imported once a command is run.'''
+
+from __future__ import absolute_import, print_function
+
+import collections
+import errno
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+# asyncio is imported by the functions that use it, which only run once a
+# command has been
+# pylint: disable=import-outside-toplevel
+
+CommandResult = collections.namedtuple(
+    'CommandResult', ['returncode', 'stdout', 'stderr'])
+
+# the most commands that may run at the same time
+MAX_RUNNING = 16
+# bytes of stdout and of stderr kept from each command; the rest is read and
+# thrown away
+MAX_OUTPUT = 32 * 1024 * 1024
+# returncode of a command that was reaped by someone else, so its exit status
+# is lost; negative like that of a killed command, so it isn't shared
+LOST_RETURNCODE = -256
+
+# munki_facts.py runs each fact module on its own thread and tells us which
+# module that thread belongs to
+_local = threading.local()
+_lock = threading.Lock()
+_processes = {}
+# fact modules whose commands have been killed; they may not start new ones
+_killed = set()
+# resource usage of finished commands, by fact module
+_usage = {}
+# commands run, or running, during this run: (argv, env, max_output) -> flight
+_flights = {}
+# the event loop commands run on, and the semaphore that limits how many run
+# at once; started when the first command is run
+_loop_lock = threading.Lock()
+_loop = None
+_running = None
+
+
+class CommandResults(dict):
+    '''The results of run_commands(), by name. Looking up a command that
+    couldn't be run raises the exception it failed with.'''
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def _after_fork():
+    '''Forgets the parent's event loop and commands in a forked child; the
+    thread the loop ran on doesn't exist there'''
+    # pylint: disable=global-statement
+    global _lock, _loop_lock, _loop, _running
+    _lock = threading.Lock()
+    _loop_lock = threading.Lock()
+    _loop = _running = None
+    _processes.clear()
+    _killed.clear()
+    _usage.clear()
+    _flights.clear()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def reset():
+    '''Forgets the results of the commands run so far. munki_facts.py calls
+    this at the start of every run.'''
+    with _lock:
+        _flights.clear()
+
+
+def set_owner(name):
+    '''Records that commands started on this thread belong to fact module
+    name'''
+    _local.owner = name
+    with _lock:
+        _killed.discard(name)
+        _usage.pop(name, None)
+
+
+def get_owner():
+    '''Returns the fact module that commands started on this thread belong
+    to'''
+    return getattr(_local, 'owner', None)
+
+
+def usage(owner):
+    '''Returns the CPU time and peak memory used by the commands fact module
+    owner has run'''
+    with _lock:
+        return dict(_usage.get(owner, {}))
+
+
+def _record_usage(owner, rusage):
+    '''Adds the resource usage of a finished command to its owner's total'''
+    # ru_maxrss is in bytes on macOS but kilobytes elsewhere
+    max_rss = rusage.ru_maxrss
+    if sys.platform != 'darwin':
+        max_rss *= 1024
+    with _lock:
+        total = _usage.setdefault(owner, {'child_processes': 0,
+                                          'child_user_seconds': 0.0,
+                                          'child_system_seconds': 0.0,
+                                          'child_max_rss_bytes': 0})
+        total['child_processes'] += 1
+        total['child_user_seconds'] += rusage.ru_utime
+        total['child_system_seconds'] += rusage.ru_stime
+        total['child_max_rss_bytes'] = max(total['child_max_rss_bytes'],
+                                           max_rss)
+
+
+def _kill(proc):
+    '''Kills a process and its process group'''
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def kill(owner):
+    '''Kills every running command started by fact module owner that no other
+    module is waiting for, and stops it from starting any more'''
+    with _lock:
+        _killed.add(owner)
+        processes = [proc for proc in _processes.get(owner, ())
+                     if proc.owners <= _killed]
+    for proc in processes:
+        _kill(proc)
+
+
+def kill_all():
+    '''Kills every running command. Safe to call from a signal handler: it
+    doesn't take _lock, which the interrupted thread may be holding.'''
+    # copying the dict and its sets runs no Python code, so no other thread
+    # can change them part way through
+    for processes in list(_processes.values()):
+        for proc in list(processes):
+            _kill(proc)
+
+
+def _get_loop():
+    '''Returns the event loop commands run on and the semaphore that limits
+    how many run at once, starting the loop if need be'''
+    global _loop, _running  # pylint: disable=global-statement
+    import asyncio
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+            created = {}
+
+            def serve():
+                asyncio.set_event_loop(loop)
+                # the semaphore must be created on the loop's thread
+                created['running'] = asyncio.Semaphore(MAX_RUNNING)
+                started.set()
+                loop.run_forever()
+
+            threading.Thread(target=serve, name='commands',
+                             daemon=True).start()
+            started.wait()
+            _loop, _running = loop, created['running']
+        return _loop, _running
+
+
+async def _read(pipe, max_output, on_output=None):
+    '''Reads pipe to the end and returns the first max_output bytes, or
+    passes each chunk read to on_output instead if it is given'''
+    import asyncio
+    reader = asyncio.StreamReader()
+    loop = asyncio.get_event_loop()
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    chunks = []
+    size = 0
+    try:
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                return b''.join(chunks)
+            if on_output is not None:
+                # on another thread, so the loop carries on with the other
+                # commands; nothing more is read until it has returned
+                await loop.run_in_executor(None, on_output, chunk)
+            elif size < max_output:
+                chunks.append(chunk[:max_output - size])
+            size += len(chunk)
+    finally:
+        transport.close()
+
+
+async def _wait(proc):
+    '''Waits for proc to exit, and records its resource usage as
+    proc.rusage'''
+    import asyncio
+    # os.wait4() reaps the process like Popen.poll() would, and also returns
+    # its resource usage; by the time its output has been read it has
+    # usually exited already
+    delay = 0.001
+    while proc.returncode is None:
+        try:
+            pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+        except ChildProcessError:
+            proc.returncode = LOST_RETURNCODE
+            break
+        if pid:
+            proc.rusage = rusage
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            break
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+
+async def _communicate(proc, max_output, on_stdout=None):
+    '''Reads proc's output and waits for it to exit'''
+    import asyncio
+    stdout, stderr = await asyncio.gather(
+        _read(proc.stdout, max_output, on_stdout),
+        _read(proc.stderr, max_output))
+    await _wait(proc)
+    return stdout, stderr
+
+
+async def _run(flight, argv, timeout, env, max_output, running,
+               on_stdout=None):
+    '''Runs argv on the event loop for the owners in flight and returns a
+    CommandResult with the output as bytes'''
+    import asyncio
+    owners = flight['owners']
+    async with running:
+        with _lock:
+            if owners <= _killed:
+                raise OSError(errno.ECANCELED, 'Fact module %s timed out'
+                              % ', '.join(sorted(owners)))
+        proc = subprocess.Popen(argv, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                env=env, start_new_session=True)
+        proc.rusage = None
+        proc.owners = owners
+        with _lock:
+            flight['proc'] = proc
+            for owner in owners:
+                _processes.setdefault(owner, set()).add(proc)
+            killed = owners <= _killed
+        if killed:
+            # the runner gave up on these modules while the command was
+            # starting
+            _kill(proc)
+        try:
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    _communicate(proc, max_output, on_stdout), timeout)
+            except asyncio.TimeoutError:
+                _kill(proc)
+                await _wait(proc)
+                raise subprocess.TimeoutExpired(argv, timeout)
+            except Exception:
+                # on_stdout failed; the rest of the output isn't wanted
+                _kill(proc)
+                await _wait(proc)
+                raise
+        finally:
+            with _lock:
+                flight['proc'] = None
+                for owner in owners:
+                    _processes[owner].discard(proc)
+            if proc.rusage is not None:
+                # charged to the module that asked first
+                _record_usage(flight['owner'], proc.rusage)
+    return CommandResult(proc.returncode, stdout, stderr)
+
+
+def _start(argv, timeout, env, max_output, shared, on_stdout=None):
+    '''Starts running argv, or joins the run of the same command already
+    started, and returns a concurrent.futures.Future of its CommandResult'''
+    import asyncio
+    argv = list(argv)
+    owner = get_owner()
+    key = (tuple(argv), tuple(sorted(env.items())) if env else None,
+           max_output)
+    loop, running = _get_loop()
+    with _lock:
+        flight = _flights.get(key) if shared else None
+        if flight is not None and not flight['owners'] <= _killed:
+            flight['owners'].add(owner)
+            if flight['proc'] is not None:
+                _processes.setdefault(owner, set()).add(flight['proc'])
+            return flight['future']
+        flight = {'owner': owner, 'owners': set([owner]), 'proc': None}
+        flight['future'] = asyncio.run_coroutine_threadsafe(
+            _run(flight, argv, timeout, env, max_output, running, on_stdout),
+            loop)
+        if shared:
+            _flights[key] = flight
+
+    def finished(future):
+        '''Stops sharing a command that didn't run to completion'''
+        if (future.cancelled() or future.exception() is not None or
+                future.result().returncode < 0):
+            with _lock:
+                if _flights.get(key) is flight:
+                    del _flights[key]
+
+    flight['future'].add_done_callback(finished)
+    return flight['future']
+
+
+def _result(future, argv, timeout, text):
+    '''Waits up to timeout seconds for the CommandResult of future, and
+    decodes its output if text is True'''
+    # imported by asyncio, which _start() has imported already
+    import concurrent.futures
+    try:
+        result = future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        # a command that was already running when we asked for it
+        raise subprocess.TimeoutExpired(argv, timeout)
+    if text:
+        result = result._replace(
+            stdout=result.stdout.decode('UTF-8', 'replace'),
+            stderr=result.stderr.decode('UTF-8', 'replace'))
+    return result
+
+
+def run(argv, timeout=None, text=True, env=None, max_output=MAX_OUTPUT,
+        shared=True, on_stdout=None):
+    '''Runs argv and returns a CommandResult. stdout and stderr are str if
+    text is True, bytes otherwise, and no more than max_output bytes of
+    each are kept. Raises OSError if the command can't be run, or
+    subprocess.TimeoutExpired if it runs for more than timeout seconds. If
+    shared is True, a result from the same command earlier in the run may be
+    returned instead of running it again. returncode is negative if the
+    command was killed, and LOST_RETURNCODE if something else reaped it so
+    its exit status is unknown.
+
+    If on_stdout is given, it is called with each chunk of stdout as it is
+    read, one call at a time on a thread of its own, and stdout isn't kept,
+    so output of any size can be processed in constant memory. The command
+    isn't shared then. An exception raised by on_stdout kills the command
+    and is raised by run().'''
+    if on_stdout is not None:
+        shared = False
+    future = _start(argv, timeout, env, max_output, shared, on_stdout)
+    return _result(future, argv, timeout, text)
+
+
+def run_commands(commands, timeout=None, text=True, shared=True):
+    '''Runs every command in commands, a dict mapping names to argv lists,
+    at the same time and returns a CommandResults. timeout, text and shared
+    are as for run().'''
+    futures = dict(
+        (name, _start(argv, timeout, None, MAX_OUTPUT, shared))
+        for name, argv in commands.items())
+    results = CommandResults()
+    for name, future in futures.items():
+        try:
+            results[name] = _result(future, commands[name], timeout, text)
+        except (OSError, subprocess.SubprocessError) as err:
+            results[name] = err
+    return results
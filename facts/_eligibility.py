@@ -0,0 +1,230 @@
+'''Works out which macOS releases in _releases.RELEASES this machine can be
+upgraded to.
+
+The release table is compiled by tools/build_release_index.py into
+_releases.index, which maps each model, board-id and device-id to a bitmask
+with one bit per release. The index is loaded with a single read and searched
+in place, so checking a machine is a few binary searches and bitwise
+operations however many releases are tracked. If there is no usable index,
+the same masks are built in memory from _releases.RELEASES instead.'''
+
+from __future__ import absolute_import, print_function
+
+import os
+import struct
+
+# keys of a release that list supported machines
+SUPPORTED_KINDS = ('models', 'board_ids', 'device_ids')
+
+# how each kind of key is stored in the index
+KIND_CODES = {'models': 0, 'board_ids': 1, 'device_ids': 2,
+              'unsupported_models': 3}
+KIND_NAMES = dict((code, kind) for kind, code in KIND_CODES.items())
+
+INDEX_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '_releases.index')
+TABLE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '_releases.py')
+INDEX_MAGIC = b'MFRI'
+INDEX_FORMAT_VERSION = 1
+# see tools/build_release_index.py for the layout of the index
+HEADER = struct.Struct('<4sHHII')
+MASKS = struct.Struct('<5Q')
+RELEASE = struct.Struct('<BBB')
+MASK = struct.Struct('<Q')
+KEY = struct.Struct('<BxHIQ')
+
+
+def normalize_key(kind, key):
+    '''Device-ids are compared case-insensitively'''
+    if kind == 'device_ids':
+        return key.lower()
+    return key
+
+
+class ReleaseIndex(object):
+    '''Bitmask indexes for a list of releases. Bit N of every mask stands for
+    releases[N].'''
+
+    def __init__(self, releases):
+        self.names = [release['name'] for release in releases]
+        self.masks = dict((kind, {}) for kind in
+                          SUPPORTED_KINDS + ('unsupported_models',))
+        # releases that list each kind of supported key
+        self.listed = dict((kind, 0) for kind in SUPPORTED_KINDS)
+        self.match_all = 0
+        self.match_any = 0
+        for bit, release in enumerate(releases):
+            mask = 1 << bit
+            if release.get('match', 'any') == 'all':
+                self.match_all |= mask
+            else:
+                self.match_any |= mask
+            for kind in self.masks:
+                if kind in self.listed and kind in release:
+                    self.listed[kind] |= mask
+                index = self.masks[kind]
+                for key in release.get(kind, ()):
+                    key = normalize_key(kind, key)
+                    index[key] = index.get(key, 0) | mask
+        # releases whose OS version requirements are met, by Darwin version
+        self.version_masks = [0] * max(
+            [release['max_darwin'] for release in releases] or [0])
+        for bit, release in enumerate(releases):
+            for darwin_version in range(release.get('min_darwin', 0),
+                                        release['max_darwin']):
+                self.version_masks[darwin_version] |= 1 << bit
+
+    def lookup(self, kind, key):
+        '''Returns the mask of releases that list key under kind'''
+        return self.masks[kind].get(normalize_key(kind, key), 0)
+
+    def version_mask(self, darwin_version):
+        '''Returns the mask of releases that can be installed over
+        darwin_version'''
+        if 0 <= darwin_version < len(self.version_masks):
+            return self.version_masks[darwin_version]
+        return 0
+
+
+class BinaryReleaseIndex(object):
+    '''The same masks as ReleaseIndex, read from a compiled index file'''
+
+    def __init__(self, data):
+        (magic, version, release_count, self.key_count,
+         self.version_count) = HEADER.unpack_from(data, 0)
+        if magic != INDEX_MAGIC or version != INDEX_FORMAT_VERSION:
+            raise ValueError('Not a version %s release index'
+                             % INDEX_FORMAT_VERSION)
+        offset = HEADER.size
+        (self.match_all, self.match_any, models, board_ids,
+         device_ids) = MASKS.unpack_from(data, offset)
+        self.listed = {'models': models, 'board_ids': board_ids,
+                       'device_ids': device_ids}
+        offset += MASKS.size
+        self.releases = []
+        for _ in range(release_count):
+            min_darwin, max_darwin, length = RELEASE.unpack_from(data, offset)
+            offset += RELEASE.size
+            name = data[offset:offset + length].decode('utf-8')
+            offset += length
+            self.releases.append((name, min_darwin, max_darwin))
+        self.names = [release[0] for release in self.releases]
+        self.versions_offset = offset
+        self.keys_offset = offset + self.version_count * MASK.size
+        self.strings_offset = self.keys_offset + self.key_count * KEY.size
+        self.data = data
+        # make sure the last key is all there
+        if self.key_count:
+            self.key(self.key_count - 1)
+
+    def key(self, position):
+        '''Returns the kind code, key and mask stored at position'''
+        code, length, offset, mask = KEY.unpack_from(
+            self.data, self.keys_offset + position * KEY.size)
+        start = self.strings_offset + offset
+        if start + length > len(self.data):
+            raise ValueError('Truncated release index')
+        return code, self.data[start:start + length], mask
+
+    def keys(self):
+        '''Yields the kind, key and mask of every key in the index'''
+        for position in range(self.key_count):
+            code, key, mask = self.key(position)
+            yield KIND_NAMES[code], key.decode('utf-8'), mask
+
+    def lookup(self, kind, key):
+        '''Returns the mask of releases that list key under kind'''
+        target = (KIND_CODES[kind], normalize_key(kind, key).encode('utf-8'))
+        low, high = 0, self.key_count
+        while low < high:
+            middle = (low + high) // 2
+            code, found, mask = self.key(middle)
+            if (code, found) == target:
+                return mask
+            if (code, found) < target:
+                low = middle + 1
+            else:
+                high = middle
+        return 0
+
+    def version_mask(self, darwin_version):
+        '''Returns the mask of releases that can be installed over
+        darwin_version'''
+        if 0 <= darwin_version < self.version_count:
+            offset = self.versions_offset + darwin_version * MASK.size
+            return MASK.unpack_from(self.data, offset)[0]
+        return 0
+
+
+def load_index(path):
+    '''Returns the compiled index at path, or None if it is missing or
+    unusable'''
+    try:
+        with open(path, 'rb') as file:
+            return BinaryReleaseIndex(file.read())
+    except (IOError, OSError, ValueError, struct.error):
+        return None
+
+
+def default_index():
+    '''Returns the compiled index, or an index built from the release table
+    if there is no usable compiled index'''
+    index = load_index(INDEX_PATH)
+    if index is None:
+        # pylint: disable=import-outside-toplevel
+        from facts._releases import RELEASES
+        # pylint: enable=import-outside-toplevel
+        index = ReleaseIndex(RELEASES)
+    return index
+
+
+# the index in use, and the modification time, size and inode of the
+# compiled index it was loaded from; a process that stays running, like the
+# agent, loads the index again when it is updated
+_loaded = {'index': None, 'stat': None}
+
+
+def current_index():
+    '''Returns the index, loading it again if the compiled index has changed
+    since it was last loaded'''
+    try:
+        info = os.stat(INDEX_PATH)
+        stat = (info.st_mtime, info.st_size, info.st_ino)
+    except OSError:
+        stat = None
+    if _loaded['index'] is None or _loaded['stat'] != stat:
+        _loaded['index'] = default_index()
+        _loaded['stat'] = stat
+    return _loaded['index']
+
+
+def eligible_mask(index, model, board_id, device_id, darwin_version):
+    '''Returns the mask of releases a physical machine can be upgraded to'''
+    found = {'models': index.lookup('models', model),
+             'board_ids': index.lookup('board_ids', board_id),
+             'device_ids': index.lookup('device_ids', device_id)}
+    match_any = index.match_any & (
+        found['models'] | found['board_ids'] | found['device_ids'])
+    # a release that has to check every kind of key can't be checked without
+    # the model
+    match_all = index.match_all if model else 0
+    for kind in SUPPORTED_KINDS:
+        # a release that doesn't list a kind of key doesn't care about it
+        match_all &= found[kind] | ~index.listed[kind]
+    return ((match_any | match_all) &
+            ~index.lookup('unsupported_models', model) &
+            index.version_mask(darwin_version))
+
+
+def upgrade_supported(model, board_id, device_id, darwin_version,
+                      is_virtual_machine, index=None):
+    '''Returns a dict mapping the name of each release to True if this
+    machine can be upgraded to it, False otherwise'''
+    if index is None:
+        index = current_index()
+    if is_virtual_machine:
+        return dict((name, True) for name in index.names)
+    mask = eligible_mask(index, model, board_id, device_id, darwin_version)
+    return dict((name, bool(mask & (1 << bit)))
+                for bit, name in enumerate(index.names))
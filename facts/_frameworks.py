@@ -0,0 +1,54 @@
+'''Loads PyObjC frameworks for fact modules the first time they are needed.
+
+Importing a PyObjC framework, or loading functions from a framework bundle,
+takes far longer than importing a fact module otherwise would. Fact modules
+get frameworks from here inside fact(), so loading a module whose result is
+never asked for costs nothing, and functions loaded from a bundle are shared
+by every fact module in the process.'''
+
+from __future__ import absolute_import, print_function
+
+import importlib
+import threading
+
+_lock = threading.Lock()
+# bundle identifier -> {function name: function}
+_bundle_functions = {}
+
+
+def framework(name):
+    '''Returns the PyObjC framework module name, importing it if this is the
+    first time it is needed'''
+    return importlib.import_module(name)
+
+
+def bundle_functions(identifier, functions):
+    '''Returns a dict of the functions from the framework bundle with
+    identifier. functions is a list of (name, signature) pairs, as for
+    objc.loadBundleFunctions; only those not already loaded are loaded.'''
+    with _lock:
+        loaded = _bundle_functions.setdefault(identifier, {})
+        missing = [(name, signature) for name, signature in functions
+                   if name not in loaded]
+        if missing:
+            bundle = framework('Foundation').NSBundle.bundleWithIdentifier_(
+                identifier)
+            framework('objc').loadBundleFunctions(bundle, loaded, missing)
+        return dict((name, loaded[name]) for name, _ in functions)
+
+
+class Bundle(object):
+    '''Functions from a framework bundle, as attributes, loaded when the
+    first of them is used'''
+
+    def __init__(self, identifier, functions):
+        self.identifier = identifier
+        self.functions = functions
+
+    def __getattr__(self, name):
+        if name not in [function[0] for function in self.functions]:
+            raise AttributeError(name)
+        for function_name, function in bundle_functions(
+                self.identifier, self.functions).items():
+            setattr(self, function_name, function)
+        return getattr(self, name)
@@ -0,0 +1,196 @@
+'''Hardware probes shared by fact modules.
+
+Every probe is memoized, so no matter how many fact modules ask for the model,
+board-id or a sysctl value, the IORegistry or sysctl lookup happens only once
+per run. IOKit is only loaded when the first IORegistry probe runs. Modules
+whose names start with an underscore are not fact modules and are skipped by
+munki_facts.py.
+
+A fact module can also list probes from PROBES in its DEPENDS; munki_facts.py
+then runs each of them once, alongside the fact modules, and passes their
+values to fact() as keyword arguments.'''
+
+# sysctl function by Michael Lynn
+# https://gist.github.com/pudquick/581a71425439f2cf8f09
+
+# IOKit bindings by Michael Lynn
+# https://gist.github.com/pudquick/
+#         c7dd1262bd81a32663f0#file-get_platform-py-L22-L23
+
+from __future__ import absolute_import, print_function
+
+import functools
+import os
+import platform
+import struct
+import threading
+
+from ctypes import CDLL, c_uint, byref, create_string_buffer
+from ctypes import cast, POINTER, c_int32, c_int64
+from ctypes.util import find_library
+
+from facts import _frameworks
+
+# glue to call C and Cocoa stuff
+IOKit = _frameworks.Bundle(  # pylint: disable=invalid-name
+    'com.apple.framework.IOKit',
+    [("IOServiceGetMatchingService", b"II@"),
+     ("IOServiceMatching", b"@*"),
+     ("IORegistryEntryCreateCFProperty", b"@I@@I"),
+    ])
+
+# fact modules may be run from several threads at once; a reentrant lock lets
+# probes call other probes
+_lock = threading.RLock()
+
+
+# the results of every memoized probe
+_results = []
+
+
+def memoize(func):
+    '''Decorator that remembers a probe's results until reset() is called'''
+    results = {}
+    _results.append(results)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        with _lock:
+            if key not in results:
+                results[key] = func(*args, **kwargs)
+            return results[key]
+    return wrapper
+
+
+def reset():
+    '''Forgets every probe's results, so they are looked up again.
+    munki_facts.py calls this at the start of every run.'''
+    with _lock:
+        for results in _results:
+            results.clear()
+
+
+@memoize
+def libc():
+    '''Returns the C library'''
+    return CDLL(find_library('c'))
+
+
+@memoize
+def platform_expert_device():
+    '''Returns the IOPlatformExpertDevice service'''
+    return IOKit.IOServiceGetMatchingService(
+        0, IOKit.IOServiceMatching(b"IOPlatformExpertDevice"))
+
+
+@memoize
+def io_key(keyname):
+    """Gets a raw value from the IORegistry"""
+    return IOKit.IORegistryEntryCreateCFProperty(
+        platform_expert_device(), keyname, None, 0)
+
+
+@memoize
+def io_key_string_value(keyname):
+    """Converts NSData/CFData return value to an NSString"""
+    raw_value = io_key(keyname)
+    if raw_value is None:
+        return ''
+    foundation = _frameworks.framework('Foundation')
+    return foundation.NSString.alloc().initWithData_encoding_(
+        raw_value, foundation.NSUTF8StringEncoding
+    ).rstrip('\0')
+
+
+@memoize
+def sysctl(name, output_type=str):
+    '''Wrapper for sysctl so we don't have to use subprocess'''
+    if isinstance(name, str):
+        name = name.encode('utf-8')
+    size = c_uint(0)
+    # Find out how big our buffer will be
+    libc().sysctlbyname(name, None, byref(size), None, 0)
+    # Make the buffer
+    buf = create_string_buffer(size.value)
+    # Re-run, but provide the buffer
+    libc().sysctlbyname(name, buf, byref(size), None, 0)
+    if output_type in (str, 'str'):
+        return buf.value.decode('UTF-8')
+    if output_type in (int, 'int'):
+        # complex stuff to cast the buffer contents to a Python int
+        if size.value == 4:
+            return cast(buf, POINTER(c_int32)).contents.value
+        if size.value == 8:
+            return cast(buf, POINTER(c_int64)).contents.value
+    if output_type == 'raw':
+        # sysctl can also return a 'struct' type; just return the raw buffer
+        return buf.raw
+    return None
+
+
+@memoize
+def get_macos_version():
+    '''Returns the major macOS version: 10, 11, 12, etc'''
+    return int(platform.mac_ver()[0].split('.')[0])
+
+
+@memoize
+def get_darwin_version():
+    '''Returns the major Darwin version: 18 for Mojave, 20 for Big Sur, etc'''
+    return int(os.uname()[2].split('.')[0])
+
+
+@memoize
+def get_boot_time():
+    '''Returns the time the machine started up, in seconds since the epoch,
+    or None if it can't be found'''
+    # kern.boottime is a struct timeval; tv_sec comes first
+    try:
+        return struct.unpack_from(
+            '=q', sysctl('kern.boottime', output_type='raw'))[0]
+    except struct.error:
+        return None
+
+
+@memoize
+def is_virtual_machine():
+    '''Returns True if this is a VM, False otherwise'''
+    if get_macos_version() >= 11:
+        return bool(sysctl('kern.hv_vmm_present', output_type=int))
+    cpu_features = sysctl('machdep.cpu.features').split()
+    return 'VMM' in cpu_features
+
+
+def get_current_model():
+    '''Returns model info'''
+    return io_key_string_value("model")
+
+
+def get_board_id():
+    '''Returns our board-id'''
+    return io_key_string_value("board-id")
+
+
+def get_device_id():
+    '''Returns our device-id'''
+    return sysctl("hw.target").lower()
+
+
+# probes a fact module can list in its DEPENDS and receive as arguments to
+# fact(), by name
+PROBES = {
+    'model': get_current_model,
+    'board_id': get_board_id,
+    'device_id': get_device_id,
+    'macos_version': get_macos_version,
+    'darwin_version': get_darwin_version,
+    'boot_time': get_boot_time,
+    'is_virtual_machine': is_virtual_machine,
+}
+
+
+def get_probes(names):
+    '''Returns a dict mapping each of names, from PROBES, to its value. Fact
+    modules use this when run by themselves, without munki_facts.py.'''
+    return dict((name, PROBES[name]()) for name in names)
@@ -0,0 +1,710 @@
+'''macOS releases checked by the macos_upgrade_supported fact.
+
+Each release has these keys:
+    name: used to name the fact, e.g. 'sequoia' gives
+        'sequoia_upgrade_supported'
+    version: the macOS version, for humans
+    min_darwin, max_darwin: the machine must currently be running a Darwin
+        version >= min_darwin and < max_darwin. Darwin 18 is macOS 10.14,
+        20 is macOS 11, 24 is macOS 15, and so on.
+    models, board_ids, device_ids: supported model identifiers, board-ids
+        and device-ids (hw.target). Any of them may be left out.
+    unsupported_models: model identifiers that can't be upgraded
+    match: 'any' if matching any one of models, board_ids or device_ids is
+        enough; 'all' if the machine must match each of them that is listed
+
+Virtual machines are always considered supported. A machine whose model is
+in unsupported_models is never supported.
+
+Information on supported models is buried in the installer found here:
+  Install macOS Sequoia.app/Contents/SharedSupport/SharedSupport.dmg - mount
+  this
+    /Volumes/Shared Support/com_apple_MobileAsset_MacSoftwareUpdate/
+    LONG_HEX_STRING.zip - decompress this, the name of the zip will most
+    likely change with every OS update.
+      - Combining, sorting, and de-duping values from the following result
+        in a list of supported models
+          - 'SupportedProductTypes' from
+            LONG_HEX_STRING/AssetData/boot/Restore.plist
+          - 'SupportedModelProperties' from
+            LONG_HEX_STRING/AssetData/boot/PlatformSupport.plist
+      - board-ids are in 'SupportedBoardIds' in PlatformSupport.plist
+
+Device-ids for Monterey were harvested from the full installer Distribution
+file for the macOS 12.0.1 ProductID 002-23774.
+'''
+
+RELEASES = [
+    {
+        'name': 'mojave',
+        'version': '10.14',
+        'min_darwin': 11,
+        'max_darwin': 18,
+        'match': 'all',
+        'unsupported_models': [
+            'MacBook1,1',
+            'MacBook2,1',
+            'MacBook3,1',
+            'MacBook4,1',
+            'MacBook5,1',
+            'MacBook5,2',
+            'MacBook6,1',
+            'MacBook7,1',
+            'MacBookAir1,1',
+            'MacBookAir2,1',
+            'MacBookAir3,1',
+            'MacBookAir3,2',
+            'MacBookAir4,1',
+            'MacBookAir4,2',
+            'MacBookPro1,1',
+            'MacBookPro1,2',
+            'MacBookPro2,1',
+            'MacBookPro2,2',
+            'MacBookPro3,1',
+            'MacBookPro4,1',
+            'MacBookPro5,1',
+            'MacBookPro5,2',
+            'MacBookPro5,3',
+            'MacBookPro5,4',
+            'MacBookPro5,5',
+            'MacBookPro6,1',
+            'MacBookPro6,2',
+            'MacBookPro7,1',
+            'MacBookPro8,1',
+            'MacBookPro8,2',
+            'MacBookPro8,3',
+            'MacPro1,1',
+            'MacPro2,1',
+            'MacPro3,1',
+            'MacPro4,1',
+            'Macmini1,1',
+            'Macmini2,1',
+            'Macmini3,1',
+            'Macmini4,1',
+            'Macmini5,1',
+            'Macmini5,2',
+            'Macmini5,3',
+            'Xserve1,1',
+            'Xserve2,1',
+            'Xserve3,1',
+            'iMac10,1',
+            'iMac11,1',
+            'iMac11,2',
+            'iMac11,3',
+            'iMac12,1',
+            'iMac12,2',
+            'iMac4,1',
+            'iMac4,2',
+            'iMac5,1',
+            'iMac5,2',
+            'iMac6,1',
+            'iMac7,1',
+            'iMac8,1',
+            'iMac9,1',
+        ],
+        'board_ids': [
+            'Mac-00BE6ED71E35EB86',
+            'Mac-031AEE4D24BFF0B1',
+            'Mac-031B6874CF7F642A',
+            'Mac-06F11F11946D27C5',
+            'Mac-06F11FD93F0323C5',
+            'Mac-112B0A653D3AAB9C',
+            'Mac-189A3D4F975D5FFC',
+            'Mac-27ADBB7B4CEE8E61',
+            'Mac-2BD1B31983FE1663',
+            'Mac-2E6FAB96566FE58C',
+            'Mac-35C1E88140C3E6CF',
+            'Mac-35C5E08120C7EEAF',
+            'Mac-3CBD00234E554E41',
+            'Mac-42FD25EABCABB274',
+            'Mac-473D31EABEB93F9B',
+            'Mac-4B682C642B45593E',
+            'Mac-4B7AC7E43945597E',
+            'Mac-50619A408DB004DA',
+            'Mac-551B86E5744E2388',
+            'Mac-5A49A77366F81C72',
+            'Mac-65CE76090165799A',
+            'Mac-66E35819EE2D0D05',
+            'Mac-66F35F19FE2A0D05',
+            'Mac-6F01561E16C75D06',
+            'Mac-77EB7D7DAF985301',
+            'Mac-77F17D7DA9285301',
+            'Mac-7BA5B2D9E42DDD94',
+            'Mac-7DF21CB3ED6977E5',
+            'Mac-7DF2A3B5E5D671ED',
+            'Mac-81E3E92DD6088272',
+            'Mac-827FB448E656EC26',
+            'Mac-90BE64C3CB5A9AEB',
+            'Mac-937A206F2EE63C01',
+            'Mac-937CB26E2E02BB01',
+            'Mac-9AE82516C7C6B903',
+            'Mac-9F18E312C5C2BF0B',
+            'Mac-A369DDC4E67F1C45',
+            'Mac-A5C67F76ED83108C',
+            'Mac-AFD8A9D944EA4843',
+            'Mac-B4831CEBD52A0C4C',
+            'Mac-B809C3757DA9BB8D',
+            'Mac-BE088AF8C5EB4FA2',
+            'Mac-BE0E8AC46FE800CC',
+            'Mac-C3EC7CD22292981F',
+            'Mac-C6F71043CEAA02A6',
+            'Mac-CAD6701F7CEA0921',
+            'Mac-CF21D135A7D34AA6',
+            'Mac-DB15BD556843C820',
+            'Mac-E43C1C25D4880AD6',
+            'Mac-EE2EBD4B90B839A8',
+            'Mac-F221BEC8',
+            'Mac-F305150B0C7DEEEF',
+            'Mac-F60DEB81FF30ACF6',
+            'Mac-F65AE981FFA204ED',
+            'Mac-FA842E06C61E91C5',
+            'Mac-FC02E91DDD3FA6A4',
+            'Mac-FFE5EF870D7BA81A',
+        ],
+    },
+    {
+        'name': 'catalina',
+        'version': '10.15',
+        'min_darwin': 13,
+        'max_darwin': 19,
+        'match': 'all',
+        'unsupported_models': [
+            'MacBook1,1',
+            'MacBook2,1',
+            'MacBook3,1',
+            'MacBook4,1',
+            'MacBook5,1',
+            'MacBook5,2',
+            'MacBook6,1',
+            'MacBook7,1',
+            'MacBookAir1,1',
+            'MacBookAir2,1',
+            'MacBookAir3,1',
+            'MacBookAir3,2',
+            'MacBookAir4,1',
+            'MacBookAir4,2',
+            'MacBookPro1,1',
+            'MacBookPro1,2',
+            'MacBookPro2,1',
+            'MacBookPro2,2',
+            'MacBookPro3,1',
+            'MacBookPro4,1',
+            'MacBookPro5,1',
+            'MacBookPro5,2',
+            'MacBookPro5,3',
+            'MacBookPro5,4',
+            'MacBookPro5,5',
+            'MacBookPro6,1',
+            'MacBookPro6,2',
+            'MacBookPro7,1',
+            'MacBookPro8,1',
+            'MacBookPro8,2',
+            'MacBookPro8,3',
+            'MacPro1,1',
+            'MacPro2,1',
+            'MacPro3,1',
+            'MacPro4,1',
+            'MacPro5,1',
+            'Macmini1,1',
+            'Macmini2,1',
+            'Macmini3,1',
+            'Macmini4,1',
+            'Macmini5,1',
+            'Macmini5,2',
+            'Macmini5,3',
+            'Xserve1,1',
+            'Xserve2,1',
+            'Xserve3,1',
+            'iMac10,1',
+            'iMac11,1',
+            'iMac11,2',
+            'iMac11,3',
+            'iMac12,1',
+            'iMac12,2',
+            'iMac4,1',
+            'iMac4,2',
+            'iMac5,1',
+            'iMac5,2',
+            'iMac6,1',
+            'iMac7,1',
+            'iMac8,1',
+            'iMac9,1',
+        ],
+        'board_ids': [
+            'Mac-00BE6ED71E35EB86',
+            'Mac-031AEE4D24BFF0B1',
+            'Mac-031B6874CF7F642A',
+            'Mac-06F11F11946D27C5',
+            'Mac-06F11FD93F0323C5',
+            'Mac-112818653D3AABFC',
+            'Mac-112B0A653D3AAB9C',
+            'Mac-189A3D4F975D5FFC',
+            'Mac-1E7E29AD0135F9BC',
+            'Mac-226CB3C6A851A671',
+            'Mac-27AD2F918AE68F61',
+            'Mac-27ADBB7B4CEE8E61',
+            'Mac-2BD1B31983FE1663',
+            'Mac-2E6FAB96566FE58C',
+            'Mac-35C1E88140C3E6CF',
+            'Mac-35C5E08120C7EEAF',
+            'Mac-3CBD00234E554E41',
+            'Mac-42FD25EABCABB274',
+            'Mac-473D31EABEB93F9B',
+            'Mac-4B682C642B45593E',
+            'Mac-4B7AC7E43945597E',
+            'Mac-50619A408DB004DA',
+            'Mac-53FDB3D8DB8CA971',
+            'Mac-551B86E5744E2388',
+            'Mac-5A49A77366F81C72',
+            'Mac-63001698E7A34814',
+            'Mac-65CE76090165799A',
+            'Mac-66E35819EE2D0D05',
+            'Mac-66F35F19FE2A0D05',
+            'Mac-6F01561E16C75D06',
+            'Mac-747B1AEFF11738BE',
+            'Mac-77EB7D7DAF985301',
+            'Mac-77F17D7DA9285301',
+            'Mac-7BA5B2D9E42DDD94',
+            'Mac-7BA5B2DFE22DDD8C',
+            'Mac-7DF21CB3ED6977E5',
+            'Mac-7DF2A3B5E5D671ED',
+            'Mac-81E3E92DD6088272',
+            'Mac-827FAC58A8FDFA22',
+            'Mac-827FB448E656EC26',
+            'Mac-90BE64C3CB5A9AEB',
+            'Mac-937A206F2EE63C01',
+            'Mac-937CB26E2E02BB01',
+            'Mac-9394BDF4BF862EE7',
+            'Mac-9AE82516C7C6B903',
+            'Mac-9F18E312C5C2BF0B',
+            'Mac-A369DDC4E67F1C45',
+            'Mac-A5C67F76ED83108C',
+            'Mac-AA95B1DDAB278B95',
+            'Mac-AFD8A9D944EA4843',
+            'Mac-B4831CEBD52A0C4C',
+            'Mac-B809C3757DA9BB8D',
+            'Mac-BE088AF8C5EB4FA2',
+            'Mac-BE0E8AC46FE800CC',
+            'Mac-C3EC7CD22292981F',
+            'Mac-C6F71043CEAA02A6',
+            'Mac-CAD6701F7CEA0921',
+            'Mac-CF21D135A7D34AA6',
+            'Mac-DB15BD556843C820',
+            'Mac-E43C1C25D4880AD6',
+            'Mac-EE2EBD4B90B839A8',
+            'Mac-F305150B0C7DEEEF',
+            'Mac-F60DEB81FF30ACF6',
+            'Mac-F65AE981FFA204ED',
+            'Mac-FA842E06C61E91C5',
+            'Mac-FC02E91DDD3FA6A4',
+            'Mac-FFE5EF870D7BA81A',
+        ],
+    },
+    {
+        'name': 'bigsur',
+        'version': '11',
+        'min_darwin': 13,
+        'max_darwin': 20,
+        'match': 'any',
+        'models': [
+            'MacBook10,1',
+            'MacBook8,1',
+            'MacBook9,1',
+            'MacBookAir6,1',
+            'MacBookAir6,2',
+            'MacBookAir7,1',
+            'MacBookAir7,2',
+            'MacBookAir8,1',
+            'MacBookAir8,2',
+            'MacBookPro11,2',
+            'MacBookPro11,3',
+            'MacBookPro11,4',
+            'MacBookPro11,5',
+            'MacBookPro12,1',
+            'MacBookPro13,1',
+            'MacBookPro13,2',
+            'MacBookPro13,3',
+            'MacBookPro14,1',
+            'MacBookPro14,2',
+            'MacBookPro14,3',
+            'MacBookPro15,1',
+            'MacBookPro15,2',
+            'MacBookPro15,3',
+            'MacBookPro15,4',
+            'MacPro6,1',
+            'MacPro7,1',
+            'Macmini7,1',
+            'Macmini8,1',
+            'iMac14,4',
+            'iMac15,1',
+            'iMac16,1',
+            'iMac16,2',
+            'iMac17,1',
+            'iMac18,1',
+            'iMac18,2',
+            'iMac18,3',
+            'iMac19,1',
+            'iMac19,2',
+            'iMacPro1,1',
+        ],
+        'board_ids': [
+            'Mac-06F11F11946D27C5',
+            'Mac-06F11FD93F0323C5',
+            'Mac-0CFF9C7C2B63DF8D',
+            'Mac-112818653D3AABFC',
+            'Mac-112B0A653D3AAB9C',
+            'Mac-1E7E29AD0135F9BC',
+            'Mac-226CB3C6A851A671',
+            'Mac-27AD2F918AE68F61',
+            'Mac-2BD1B31983FE1663',
+            'Mac-35C1E88140C3E6CF',
+            'Mac-35C5E08120C7EEAF',
+            'Mac-36B6B6DA9CFCD881',
+            'Mac-3CBD00234E554E41',
+            'Mac-42FD25EABCABB274',
+            'Mac-473D31EABEB93F9B',
+            'Mac-4B682C642B45593E',
+            'Mac-50619A408DB004DA',
+            'Mac-53FDB3D8DB8CA971',
+            'Mac-551B86E5744E2388',
+            'Mac-564FBA6031E5946A',
+            'Mac-5A49A77366F81C72',
+            'Mac-5F9802EFE386AA28',
+            'Mac-63001698E7A34814',
+            'Mac-65CE76090165799A',
+            'Mac-66E35819EE2D0D05',
+            'Mac-6FEBD60817C77D8A',
+            'Mac-747B1AEFF11738BE',
+            'Mac-77F17D7DA9285301',
+            'Mac-7BA5B2D9E42DDD94',
+            'Mac-7BA5B2DFE22DDD8C',
+            'Mac-7DF21CB3ED6977E5',
+            'Mac-81E3E92DD6088272',
+            'Mac-827FAC58A8FDFA22',
+            'Mac-827FB448E656EC26',
+            'Mac-87DCB00F4AD77EEA',
+            'Mac-90BE64C3CB5A9AEB',
+            'Mac-937A206F2EE63C01',
+            'Mac-937CB26E2E02BB01',
+            'Mac-9394BDF4BF862EE7',
+            'Mac-9AE82516C7C6B903',
+            'Mac-9F18E312C5C2BF0B',
+            'Mac-A369DDC4E67F1C45',
+            'Mac-A5C67F76ED83108C',
+            'Mac-A61BADE1FDAD7B05',
+            'Mac-AA95B1DDAB278B95',
+            'Mac-AF89B6D9451A490B',
+            'Mac-B4831CEBD52A0C4C',
+            'Mac-B809C3757DA9BB8D',
+            'Mac-BE088AF8C5EB4FA2',
+            'Mac-BE0E8AC46FE800CC',
+            'Mac-C6F71043CEAA02A6',
+            'Mac-CAD6701F7CEA0921',
+            'Mac-CF21D135A7D34AA6',
+            'Mac-CFF7D910A743CAAF',
+            'Mac-DB15BD556843C820',
+            'Mac-E1008331FDC96864',
+            'Mac-E43C1C25D4880AD6',
+            'Mac-E7203C0F68AA0004',
+            'Mac-EE2EBD4B90B839A8',
+            'Mac-F305150B0C7DEEEF',
+            'Mac-F60DEB81FF30ACF6',
+            'Mac-FA842E06C61E91C5',
+            'Mac-FFE5EF870D7BA81A',
+        ],
+    },
+    {
+        'name': 'monterey',
+        'version': '12',
+        'min_darwin': 13,
+        'max_darwin': 21,
+        'match': 'any',
+        'models': [
+            'MacBook10,1',
+            'MacBook9,1',
+            'MacBookAir7,1',
+            'MacBookAir7,2',
+            'MacBookAir8,1',
+            'MacBookAir8,2',
+            'MacBookAir9,1',
+            'MacBookPro11,4',
+            'MacBookPro11,5',
+            'MacBookPro12,1',
+            'MacBookPro13,1',
+            'MacBookPro13,2',
+            'MacBookPro13,3',
+            'MacBookPro14,1',
+            'MacBookPro14,2',
+            'MacBookPro14,3',
+            'MacBookPro15,1',
+            'MacBookPro15,2',
+            'MacBookPro15,3',
+            'MacBookPro15,4',
+            'MacBookPro16,1',
+            'MacBookPro16,2',
+            'MacBookPro16,3',
+            'MacBookPro16,4',
+            'MacPro6,1',
+            'MacPro7,1',
+            'Macmini7,1',
+            'Macmini8,1',
+            'iMac16,1',
+            'iMac16,2',
+            'iMac17,1',
+            'iMac18,1',
+            'iMac18,2',
+            'iMac18,3',
+            'iMac19,1',
+            'iMac19,2',
+            'iMac20,1',
+            'iMac20,2',
+            'iMacPro1,1',
+        ],
+        'board_ids': [
+            'Mac-06F11F11946D27C5',
+            'Mac-06F11FD93F0323C5',
+            'Mac-0CFF9C7C2B63DF8D',
+            'Mac-112818653D3AABFC',
+            'Mac-1E7E29AD0135F9BC',
+            'Mac-226CB3C6A851A671',
+            'Mac-27AD2F918AE68F61',
+            'Mac-35C5E08120C7EEAF',
+            'Mac-473D31EABEB93F9B',
+            'Mac-4B682C642B45593E',
+            'Mac-53FDB3D8DB8CA971',
+            'Mac-551B86E5744E2388',
+            'Mac-5F9802EFE386AA28',
+            'Mac-63001698E7A34814',
+            'Mac-65CE76090165799A',
+            'Mac-66E35819EE2D0D05',
+            'Mac-77F17D7DA9285301',
+            'Mac-7BA5B2D9E42DDD94',
+            'Mac-7BA5B2DFE22DDD8C',
+            'Mac-827FAC58A8FDFA22',
+            'Mac-827FB448E656EC26',
+            'Mac-937A206F2EE63C01',
+            'Mac-937CB26E2E02BB01',
+            'Mac-9AE82516C7C6B903',
+            'Mac-9F18E312C5C2BF0B',
+            'Mac-A369DDC4E67F1C45',
+            'Mac-A5C67F76ED83108C',
+            'Mac-A61BADE1FDAD7B05',
+            'Mac-AA95B1DDAB278B95',
+            'Mac-AF89B6D9451A490B',
+            'Mac-B4831CEBD52A0C4C',
+            'Mac-B809C3757DA9BB8D',
+            'Mac-BE088AF8C5EB4FA2',
+            'Mac-CAD6701F7CEA0921',
+            'Mac-CFF7D910A743CAAF',
+            'Mac-DB15BD556843C820',
+            'Mac-E1008331FDC96864',
+            'Mac-E43C1C25D4880AD6',
+            'Mac-E7203C0F68AA0004',
+            'Mac-EE2EBD4B90B839A8',
+            'Mac-F60DEB81FF30ACF6',
+            'Mac-FFE5EF870D7BA81A',
+            'VMM-x86_64',
+        ],
+        'device_ids': [
+            'J132AP',
+            'J137AP',
+            'J140AAP',
+            'J140KAP',
+            'J152FAP',
+            'J160AP',
+            'J174AP',
+            'J185AP',
+            'J185FAP',
+            'J213AP',
+            'J214AP',
+            'J214KAP',
+            'J215AP',
+            'J223AP',
+            'J230AP',
+            'J230KAP',
+            'J274AP',
+            'J293AP',
+            'J313AP',
+            'J314cAP',
+            'J314sAP',
+            'J316cAP',
+            'J316sAP',
+            'J456AP',
+            'J457AP',
+            'J680AP',
+            'J780AP',
+            'VMA2MACOSAP',
+            'VMM-x86_64',
+            'X589AMLUAP',
+            'X86LEGACYAP',
+        ],
+    },
+    {
+        'name': 'ventura',
+        'version': '13',
+        'min_darwin': 0,
+        'max_darwin': 22,
+        'match': 'any',
+        'models': [
+            'Mac13,1',
+            'Mac13,2',
+            'Mac14,2',
+            'Mac14,7',
+            'MacBook10,1',
+            'MacBookAir10,1',
+            'MacBookAir8,1',
+            'MacBookAir8,2',
+            'MacBookAir9,1',
+            'MacBookPro14,1',
+            'MacBookPro14,2',
+            'MacBookPro14,3',
+            'MacBookPro15,1',
+            'MacBookPro15,2',
+            'MacBookPro15,3',
+            'MacBookPro15,4',
+            'MacBookPro16,1',
+            'MacBookPro16,2',
+            'MacBookPro16,3',
+            'MacBookPro16,4',
+            'MacBookPro17,1',
+            'MacBookPro18,1',
+            'MacBookPro18,2',
+            'MacBookPro18,3',
+            'MacBookPro18,4',
+            'MacPro7,1',
+            'Macmini8,1',
+            'Macmini9,1',
+            'VirtualMac2,1',
+            'iMac18,1',
+            'iMac18,2',
+            'iMac18,3',
+            'iMac19,1',
+            'iMac19,2',
+            'iMac20,1',
+            'iMac20,2',
+            'iMac21,1',
+            'iMac21,2',
+            'iMacPro1,1',
+            'iSim1,1',
+        ],
+    },
+    {
+        'name': 'sonoma',
+        'version': '14',
+        'min_darwin': 0,
+        'max_darwin': 23,
+        'match': 'any',
+        'models': [
+            'Mac13,1',
+            'Mac13,2',
+            'Mac14,10',
+            'Mac14,12',
+            'Mac14,13',
+            'Mac14,14',
+            'Mac14,15',
+            'Mac14,2',
+            'Mac14,3',
+            'Mac14,5',
+            'Mac14,6',
+            'Mac14,7',
+            'Mac14,8',
+            'Mac14,9',
+            'Mac15,3',
+            'Mac15,4',
+            'Mac15,5',
+            'Mac15,6',
+            'Mac15,7',
+            'Mac15,8',
+            'Mac15,9',
+            'MacBookAir10,1',
+            'MacBookAir8,1',
+            'MacBookAir8,2',
+            'MacBookAir9,1',
+            'MacBookPro15,1',
+            'MacBookPro15,2',
+            'MacBookPro15,3',
+            'MacBookPro15,4',
+            'MacBookPro16,1',
+            'MacBookPro16,2',
+            'MacBookPro16,3',
+            'MacBookPro16,4',
+            'MacBookPro17,1',
+            'MacBookPro18,1',
+            'MacBookPro18,2',
+            'MacBookPro18,3',
+            'MacBookPro18,4',
+            'MacPro7,1',
+            'Macmini8,1',
+            'Macmini9,1',
+            'VirtualMac2,1',
+            'iMac19,1',
+            'iMac19,2',
+            'iMac20,1',
+            'iMac20,2',
+            'iMac21,1',
+            'iMac21,2',
+            'iMacPro1,1',
+            'iSim1,1',
+        ],
+    },
+    {
+        'name': 'sequoia',
+        'version': '15',
+        'min_darwin': 0,
+        'max_darwin': 24,
+        'match': 'any',
+        'models': [
+            'Mac13,1',
+            'Mac13,2',
+            'Mac14,10',
+            'Mac14,12',
+            'Mac14,13',
+            'Mac14,14',
+            'Mac14,15',
+            'Mac14,2',
+            'Mac14,3',
+            'Mac14,5',
+            'Mac14,6',
+            'Mac14,7',
+            'Mac14,8',
+            'Mac14,9',
+            'Mac15,10',
+            'Mac15,11',
+            'Mac15,12',
+            'Mac15,13',
+            'Mac15,3',
+            'Mac15,4',
+            'Mac15,5',
+            'Mac15,6',
+            'Mac15,7',
+            'Mac15,8',
+            'Mac15,9',
+            'MacBookAir10,1',
+            'MacBookAir9,1',
+            'MacBookPro15,1',
+            'MacBookPro15,2',
+            'MacBookPro15,3',
+            'MacBookPro15,4',
+            'MacBookPro16,1',
+            'MacBookPro16,2',
+            'MacBookPro16,3',
+            'MacBookPro16,4',
+            'MacBookPro17,1',
+            'MacBookPro18,1',
+            'MacBookPro18,2',
+            'MacBookPro18,3',
+            'MacBookPro18,4',
+            'MacPro7,1',
+            'Macmini8,1',
+            'Macmini9,1',
+            'VirtualMac2,1',
+            'iMac19,1',
+            'iMac19,2',
+            'iMac20,1',
+            'iMac20,2',
+            'iMac21,1',
+            'iMac21,2',
+            'iMacPro1,1',
+        ],
+    },
+]
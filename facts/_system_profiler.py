@@ -0,0 +1,258 @@
+'''Reads system_profiler data for fact modules, with a cache that lasts
+between runs.
+
+system_profiler often takes seconds to run, but most of what it reports
+doesn't change until the machine restarts. The items of each datatype are
+saved in CACHE_DIR and reused until they are older than the TTL the caller
+asks for, or the machine has restarted since. Whatever isn't cached is
+fetched with a single run of system_profiler, at the detail level the caller
+asks for: 'mini' unless it needs more.
+
+system_profiler's XML can run to megabytes, so rather than loading all of it,
+the report is parsed as it is read from system_profiler and only the item keys
+the caller asks for are kept; everything else is skipped as it is read.'''
+
+from __future__ import absolute_import, print_function
+
+import base64
+import datetime
+import os
+import plistlib
+import threading
+import time
+from xml.parsers import expat
+from xml.parsers.expat import ExpatError
+
+from facts import _command
+from facts import _probe
+
+SYSTEM_PROFILER = '/usr/sbin/system_profiler'
+CACHE_DIR = os.environ.get('MUNKI_FACTS_CACHE_DIR',
+                           '/Library/Caches/munki_facts')
+# seconds cached items are used for unless the caller says otherwise
+DEFAULT_TTL = 24 * 60 * 60
+
+# system_profiler's -detailLevel values, least detailed first
+DETAIL_LEVELS = ['mini', 'basic', 'full']
+DEFAULT_DETAIL_LEVEL = 'mini'
+
+# bytes of XML fed to the parser at a time
+CHUNK_SIZE = 64 * 1024
+
+# one fetch at a time, so modules that want the same datatypes at the same
+# time don't both run system_profiler
+_lock = threading.Lock()
+
+
+def cache_path(datatype):
+    '''Returns the path of the cache file for datatype'''
+    return os.path.join(CACHE_DIR, 'system_profiler', datatype + '.plist')
+
+
+def read_cache(datatype, ttl, keys, detail_level, now):
+    '''Returns the cached items of datatype, or None if there are none, they
+    are out of date, or they have less detail or fewer keys than asked
+    for'''
+    try:
+        with open(cache_path(datatype), 'rb') as file:
+            entry = plistlib.load(file)
+        if (entry['boot_time'] == _probe.get_boot_time() and
+                0 <= now - entry['timestamp'] < ttl and
+                DETAIL_LEVELS.index(entry['detail_level']) >=
+                DETAIL_LEVELS.index(detail_level) and
+                ('keys' not in entry or
+                 (keys is not None and set(keys) <= set(entry['keys'])))):
+            return entry['items']
+    except (IOError, OSError, ExpatError, plistlib.InvalidFileException,
+            KeyError, TypeError, ValueError):
+        pass
+    return None
+
+
+def write_cache(datatype, items, keys, detail_level, now):
+    '''Saves the items of datatype, replacing the cache file atomically'''
+    path = cache_path(datatype)
+    temp_path = '%s.%s.tmp' % (path, os.getpid())
+    entry = {'boot_time': _probe.get_boot_time(), 'timestamp': now,
+             'detail_level': detail_level, 'items': items}
+    if keys is not None:
+        entry['keys'] = sorted(keys)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, 'wb') as file:
+            plistlib.dump(entry, file, fmt=plistlib.FMT_BINARY)
+        os.rename(temp_path, path)
+    except (IOError, OSError, TypeError, OverflowError):
+        # the cache is only an optimization
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+
+
+class ReportParser(object):
+    '''Parses system_profiler's XML as it is fed in, building only the
+    _dataType of each report and the wanted keys of each of its _items'''
+    def __init__(self, keys=None):
+        # the paths of the values to keep; '*' stands for any array index
+        if keys is None:
+            self.wanted = [('*', '_dataType'), ('*', '_items')]
+        else:
+            self.wanted = [('*', '_dataType')] + [
+                ('*', '_items', '*', key) for key in keys]
+        # path -> is_wanted(path)
+        self.decisions = {}
+        self.reports = None
+        # [container, path, key of the next value] for each open dict or
+        # array being built
+        self.stack = []
+        # depth within a value that is being skipped
+        self.skipping = 0
+        self.text = []
+        self.parser = expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        self.parser.CharacterDataHandler = self.characters
+
+    def feed(self, data, final=False):
+        '''Parses the next chunk of XML'''
+        self.parser.Parse(data, final)
+
+    def is_wanted(self, path):
+        '''Returns True if the value at path, or something inside it, is
+        wanted'''
+        if path not in self.decisions:
+            self.decisions[path] = any(
+                path[:len(wanted)] == wanted or wanted[:len(path)] == path
+                for wanted in self.wanted)
+        return self.decisions[path]
+
+    def add(self, value):
+        '''Adds a finished value to the dict or array it is in'''
+        if not self.stack:
+            self.reports = value
+            return
+        container, _, key = self.stack[-1]
+        if isinstance(container, list):
+            container.append(value)
+        else:
+            container[key] = value
+
+    def start(self, tag, _attributes):
+        '''Handles an opening tag'''
+        if self.skipping:
+            self.skipping += 1
+            return
+        self.text = []
+        if tag in ('plist', 'key'):
+            return
+        path = ()
+        if self.stack:
+            container, parent_path, key = self.stack[-1]
+            path = parent_path + (
+                '*' if isinstance(container, list) else key,)
+        if not self.is_wanted(path):
+            self.skipping = 1
+            return
+        if tag == 'dict':
+            self.stack.append([{}, path, None])
+        elif tag == 'array':
+            self.stack.append([[], path, None])
+
+    def end(self, tag):
+        '''Handles a closing tag'''
+        if self.skipping:
+            self.skipping -= 1
+            return
+        text = ''.join(self.text)
+        self.text = []
+        if tag == 'plist':
+            return
+        if tag == 'key':
+            self.stack[-1][2] = text
+        elif tag in ('dict', 'array'):
+            self.add(self.stack.pop()[0])
+        elif tag == 'string':
+            self.add(text)
+        elif tag == 'integer':
+            self.add(int(text))
+        elif tag == 'real':
+            self.add(float(text))
+        elif tag in ('true', 'false'):
+            self.add(tag == 'true')
+        elif tag == 'date':
+            self.add(datetime.datetime.strptime(text, '%Y-%m-%dT%H:%M:%SZ'))
+        elif tag == 'data':
+            self.add(base64.b64decode(text))
+
+    def characters(self, data):
+        '''Collects the text of the current element'''
+        if not self.skipping:
+            self.text.append(data)
+
+
+def parse_report(output, keys=None):
+    '''Parses the XML output of system_profiler, keeping only keys of each
+    item (all of them if keys is None), and returns a dict mapping each
+    datatype reported to its list of items'''
+    parser = ReportParser(keys)
+    try:
+        for offset in range(0, len(output), CHUNK_SIZE):
+            parser.feed(output[offset:offset + CHUNK_SIZE])
+        parser.feed(b'', final=True)
+    except (ExpatError, ValueError, IndexError, TypeError):
+        return {}
+    return reports_by_datatype(parser.reports)
+
+
+def reports_by_datatype(reports):
+    '''Returns a dict mapping each datatype in the parsed reports to its
+    list of items'''
+    if not isinstance(reports, list):
+        return {}
+    return dict((report['_dataType'], report.get('_items', []))
+                for report in reports
+                if isinstance(report, dict) and '_dataType' in report)
+
+
+def fetch(datatypes, keys=None, detail_level=DEFAULT_DETAIL_LEVEL):
+    '''Runs system_profiler once for datatypes and returns a dict mapping
+    each datatype it reported to its list of items. The XML is parsed as it
+    is read, so the whole report is never held in memory. Raises OSError if
+    system_profiler can't be run or its output can't be parsed.'''
+    parser = ReportParser(keys)
+    try:
+        _command.run(
+            [SYSTEM_PROFILER, '-xml', '-detailLevel', detail_level] +
+            list(datatypes), text=False, on_stdout=parser.feed)
+        parser.feed(b'', final=True)
+    except (ExpatError, ValueError, IndexError, TypeError) as err:
+        raise OSError('Couldn\'t parse system_profiler output: %s' % err)
+    return reports_by_datatype(parser.reports)
+
+
+def get(datatypes, ttl=DEFAULT_TTL, keys=None,
+        detail_level=DEFAULT_DETAIL_LEVEL):
+    '''Returns a dict mapping each of datatypes to its list of items, from
+    the cache if they are less than ttl seconds old and the machine hasn't
+    restarted since. If keys is given, each item only has those keys.
+    Datatypes system_profiler didn't report are left out. Raises OSError if
+    system_profiler can't be run or its output can't be parsed.'''
+    with _lock:
+        now = time.time()
+        data = {}
+        for datatype in datatypes:
+            items = read_cache(datatype, ttl, keys, detail_level, now)
+            if items is not None:
+                data[datatype] = items
+        missing = [datatype for datatype in datatypes
+                   if datatype not in data]
+        if missing:
+            fetched = fetch(missing, keys, detail_level)
+            for datatype in missing:
+                if datatype in fetched:
+                    data[datatype] = fetched[datatype]
+                    write_cache(datatype, fetched[datatype], keys,
+                                detail_level, now)
+        return data
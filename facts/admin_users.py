@@ -4,6 +4,9 @@ from __future__ import absolute_import, print_function
 
 import grp
 
+# membership of the admin group rarely changes
+CACHE_TTL = 60 * 60
+
 
 def fact():
     '''Return the list of admin users for this machine'''
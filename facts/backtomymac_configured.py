@@ -2,15 +2,16 @@
 
 from __future__ import absolute_import, print_function
 
-from SystemConfiguration import SCDynamicStoreCopyValue
+from facts import _frameworks
 
 
 def fact():
     '''Return True if there is a value for SystemConfiguration's
     Setup:/Network/BackToMyMac key'''
+    system_configuration = _frameworks.framework('SystemConfiguration')
     return {'backtomymac_configured':
-            SCDynamicStoreCopyValue(None, 'Setup:/Network/BackToMyMac')
-            is not None}
+            system_configuration.SCDynamicStoreCopyValue(
+                None, 'Setup:/Network/BackToMyMac') is not None}
 
 
 if __name__ == '__main__':
@@ -2,13 +2,16 @@
 
 from __future__ import print_function
 
+CP_IDENTITY_FILE = '/Library/Application Support/CrashPlan/.identity'
+# the result only changes when the identity file does
+INPUTS = [CP_IDENTITY_FILE]
+
 
 def fact():
     '''Return CrashPlan user name'''
-    cp_identity_file = '/Library/Application Support/CrashPlan/.identity'
     username = ''
     try:
-        with open(cp_identity_file) as identity:
+        with open(CP_IDENTITY_FILE) as identity:
             for line in identity.readlines():
                 if line.startswith('username='):
                     username = line.partition('=')[2].rstrip()
@@ -2,15 +2,17 @@
 
 from __future__ import absolute_import, print_function
 
-import subprocess
+from facts import _command
 
+COMMANDS = {'status': ['/usr/sbin/spctl', '--status']}
 
-def fact():
+
+def fact(commands=None):
     '''Return the current Gatekeeper status'''
+    if commands is None:
+        commands = _command.run_commands(COMMANDS)
     try:
-        proc = subprocess.Popen(['/usr/sbin/spctl', '--status'],
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text="UTF-8")
-        stdout, _ = proc.communicate()
+        stdout = commands['status'].stdout
     except (IOError, OSError):
         stdout = 'Unknown'
 
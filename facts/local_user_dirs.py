@@ -4,12 +4,16 @@ from __future__ import absolute_import, print_function
 
 import os
 
+USERS_DIR = '/Users'
+# the result only changes when a directory is added to or removed from /Users
+INPUTS = [USERS_DIR]
+
 
 def fact():
     '''Return the list of user home directories under /Users'''
     # skip_names should include any directories you wish to ignore
     skip_names = ['Deleted Users', 'Shared', 'admin']
-    user_dirs = [item for item in os.listdir('/Users')
+    user_dirs = [item for item in os.listdir(USERS_DIR)
                  if item not in skip_names and not item.startswith('.')]
     return {'local_user_dirs': user_dirs}
 
@@ -1,86 +1,82 @@
 '''Returns a fact to indicate if this is a physical or virtual machine'''
 
-# sysctl function by Michael Lynn
-# https://gist.github.com/pudquick/581a71425439f2cf8f09
-
 from __future__ import absolute_import, print_function
 
-import plistlib
-import subprocess
-
-from ctypes import CDLL, c_uint, byref, create_string_buffer
-from ctypes import cast, POINTER
-from ctypes.util import find_library
-
-libc = CDLL(find_library('c'))
-
-
-def sysctl(name, output_type=str):
-    '''Wrapper for sysctl so we don't have to use subprocess'''
-    if isinstance(name, str):
-        name = name.encode('utf-8')
-    size = c_uint(0)
-    # Find out how big our buffer will be
-    libc.sysctlbyname(name, None, byref(size), None, 0)
-    # Make the buffer
-    buf = create_string_buffer(size.value)
-    # Re-run, but provide the buffer
-    libc.sysctlbyname(name, buf, byref(size), None, 0)
-    if output_type in (str, 'str'):
-        return buf.value.decode('UTF-8')
-    if output_type in (int, 'int'):
-        # complex stuff to cast the buffer contents to a Python int
-        if size.value == 4:
-            return cast(buf, POINTER(c_int32)).contents.value
-        if size.value == 8:
-            return cast(buf, POINTER(c_int64)).contents.value
-    if output_type == 'raw':
-        # sysctl can also return a 'struct' type; just return the raw buffer
-        return buf.raw
-
-
-def is_virtual_machine():
-    '''Returns True if this is a VM, False otherwise'''
-    cpu_features = sysctl('machdep.cpu.features').split()
-    return 'VMM' in cpu_features
-
-
-def get_machine_type():
-    '''Return the machine type: physical, vmware, virtualbox, parallels or
-    unknown_virtual'''
-    if not is_virtual_machine():
-        return 'physical'
+from facts import _probe
+from facts import _system_profiler
+
+# a machine doesn't change from physical to virtual; check once a day
+CACHE_TTL = 24 * 60 * 60
+
+# system_profiler, the last resort, can be slow
+TIMEOUT = 60
+
+# probes munki_facts.py runs once and passes to fact()
+DEPENDS = ['is_virtual_machine']
+
+# (vendor, word in the platform's model or manufacturer that names it)
+VENDOR_MARKERS = [
+    ('vmware', 'vmware'),
+    ('virtualbox', 'virtualbox'),
+    ('virtualbox', 'innotek'),
+    ('parallels', 'parallels'),
+]
+
 
-    # this is a virtual machine; see if we can tell which vendor
+def get_vendor():
+    '''Returns the VM vendor named by the platform's model or manufacturer in
+    the IORegistry, or None'''
+    platform = ' '.join([_probe.get_current_model(),
+                         _probe.io_key_string_value('manufacturer')]).lower()
+    for vendor, marker in VENDOR_MARKERS:
+        if marker in platform:
+            return vendor
+    return None
+
+
+def get_vendor_from_system_profiler():
+    '''Returns the VM vendor named by the boot ROM version or Ethernet vendor
+    id that system_profiler reports, or None'''
     try:
-        proc = subprocess.Popen(['/usr/sbin/system_profiler', '-xml',
-                                 'SPEthernetDataType', 'SPHardwareDataType'],
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        output = proc.communicate()[0]
-        try:
-            plist = plistlib.readPlistFromString(output)
-        except AttributeError:
-            plist = plistlib.loads(output)
-        br_version = plist[1]['_items'][0]['boot_rom_version']
+        data = _system_profiler.get(
+            ['SPEthernetDataType', 'SPHardwareDataType'],
+            keys=['boot_rom_version', 'spethernet_vendor-id'])
+        br_version = data['SPHardwareDataType'][0]['boot_rom_version']
         if 'VMW' in br_version:
             return 'vmware'
         elif 'VirtualBox' in br_version:
             return 'virtualbox'
         else:
-            ethernet_vid = plist[0]['_items'][0]['spethernet_vendor-id']
+            ethernet_vid = data['SPEthernetDataType'][0][
+                'spethernet_vendor-id']
             for i in ['0x1ab8', '0x1af4']:
                 if i in ethernet_vid:
                     return 'parallels'
 
-    except (IOError, KeyError, OSError):
+    except (IOError, IndexError, KeyError, OSError):
         pass
 
-    return 'unknown_virtual'
+    return None
+
+
+def get_machine_type(is_virtual_machine):
+    '''Return the machine type: physical, vmware, virtualbox, parallels or
+    unknown_virtual'''
+    if not is_virtual_machine:
+        return 'physical'
+
+    # this is a virtual machine; see if we can tell which vendor, falling
+    # back to system_profiler only if the IORegistry doesn't say
+    return (get_vendor() or get_vendor_from_system_profiler() or
+            'unknown_virtual')
 
 
-def fact():
+def fact(**probes):
     '''Return our physical_or_virtual fact'''
-    return {'physical_or_virtual': get_machine_type()}
+    if not probes:
+        probes = _probe.get_probes(DEPENDS)
+    return {'physical_or_virtual': get_machine_type(
+        probes['is_virtual_machine'])}
 
 
 if __name__ == '__main__':
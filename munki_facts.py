@@ -4,74 +4,1649 @@ return to our ConditionalItems.plist'''
 
 from __future__ import absolute_import, print_function
 
+import argparse
+import ast
+import errno
+import fcntl
 import importlib.util
+import json
+import math
 import os
 import plistlib
+import queue
+import resource
+import signal
+import socket
 import sys
+import threading
+import time
 from xml.parsers.expat import ExpatError
 
-# pylint: disable=no-name-in-module
-from CoreFoundation import CFPreferencesCopyAppValue
-# pylint: enable=no-name-in-module
+from facts import _command
 
 
-def main():
-    # pylint: disable=too-many-locals
-    '''Run all our fact plugins and collect their data'''
-    module_dir = os.path.join(os.path.dirname(__file__), 'facts')
-    facts = {}
+# Munki's own default for ManagedInstallDir
+DEFAULT_MANAGED_INSTALL_DIR = '/Library/Managed Installs'
+MANAGED_INSTALL_DIR_ENV = 'MUNKI_FACTS_MANAGED_INSTALL_DIR'
+# The files CFPreferences reads Munki's preferences from when run as root, in
+# order of precedence
+PREFERENCES_FILES = [
+    '/Library/Managed Preferences/ManagedInstalls.plist',
+    '~/Library/Preferences/ManagedInstalls.plist',
+    '/Library/Preferences/ManagedInstalls.plist',
+]
+
+# Most of the time spent running facts is spent waiting on external tools, so
+# a thread pool lets the slow ones overlap
+DEFAULT_WORKERS = 8
+
+# Seconds a fact module may run unless it sets its own TIMEOUT, and seconds
+# the whole run may take. Whatever has finished by then is still saved.
+DEFAULT_FACT_TIMEOUT = 30
+DEFAULT_RUN_TIMEOUT = 60
+
+# Results of fact modules are kept in this file next to ConditionalItems.plist
+# so modules that declare a CACHE_TTL don't have to run on every Munki run
+CACHE_FILENAME = 'FactsCache.plist'
+CACHE_FORMAT_VERSION = 1
+# The cache also keeps a history of each module's run times, used to start
+# the slowest modules first: the last HISTORY_SAMPLES run times, and a moving
+# average in which each run has HISTORY_WEIGHT
+HISTORY_SAMPLES = 20
+HISTORY_WEIGHT = 0.3
+# A module that fails or times out this many runs in a row is skipped, and
+# its last good result used, for BACKOFF_SECONDS; each failure after that
+# doubles the wait, up to MAX_BACKOFF_SECONDS
+FAILURE_THRESHOLD = 3
+BACKOFF_SECONDS = 30 * 60
+MAX_BACKOFF_SECONDS = 24 * 60 * 60
+# Seconds within which two changes to a file may leave it with the same
+# modification time (HFS+ only keeps whole seconds)
+INPUT_MTIME_RESOLUTION = 1
+
+# Every munki_facts.py process collecting facts into ManagedInstallDir holds
+# a lock on this file while it does, and leaves what it collected in it
+LOCK_FILENAME = 'munki_facts.lock'
+# Seconds between attempts to take the lock
+LOCK_POLL_INTERVAL = 0.05
+
+# The resident agent (--agent) answers clients on this socket, and runs the
+# fact modules this often as well as whenever a client asks
+DEFAULT_SOCKET_PATH = '/var/run/munki_facts.sock'
+DEFAULT_AGENT_INTERVAL = 15 * 60
+# Largest request the agent reads, and seconds a client waits for the agent
+# beyond the run timeout
+MAX_AGENT_REQUEST = 64 * 1024
+AGENT_REPLY_SLACK = 10
+
+# With --isolate, fact modules run in a pool of worker processes. A worker is
+# replaced after running this many modules, or once its peak memory use
+# passes this many bytes.
+DEFAULT_WORKER_MAX_TASKS = 100
+DEFAULT_WORKER_MAX_RSS = 512 * 1024 * 1024
+# Imported once by the process workers are forked from, so each worker starts
+# with them loaded. PyObjC frameworks aren't: the Objective-C runtime isn't
+# safe to use in a child forked after it has been loaded.
+WORKER_PRELOAD = ['facts._command', 'facts._frameworks', 'facts._probe',
+                  'facts._system_profiler']
+
+# Names of the files --metrics writes
+METRICS_JSON_FILENAME = 'munki_facts.json'
+METRICS_PROM_FILENAME = 'munki_facts.prom'
 
-    # find all the .py files in the 'facts' dir
-    fact_files = [
+# Per-module figures exported as Prometheus gauges: (name, help)
+MODULE_METRICS = [
+    ('import_seconds', 'Time taken to load the fact module.'),
+    ('fact_seconds', 'Wall time of the fact module\'s fact() function.'),
+    ('cpu_seconds', 'CPU time used by the fact module\'s thread.'),
+    ('child_processes', 'Number of commands the fact module ran.'),
+    ('child_user_seconds', 'User CPU time used by the commands the fact '
+     'module ran.'),
+    ('child_system_seconds', 'System CPU time used by the commands the fact '
+     'module ran.'),
+    ('child_max_rss_bytes', 'Largest peak memory use of the commands the '
+     'fact module ran.'),
+    ('cached', '1 if the fact module\'s result came from the cache.'),
+    ('age_seconds', 'Age of the fact module\'s result, if it came from an '
+     'earlier run.'),
+    ('failures', 'Runs in a row in which the fact module has failed.'),
+]
+
+
+def get_fact_files(module_dir):
+    '''Returns a sorted list of the names of the fact modules in module_dir.
+    Modules whose names start with an underscore hold code shared by fact
+    modules and are not fact modules themselves.'''
+    return sorted(
         os.path.splitext(name)[0]
         for name in os.listdir(module_dir)
-        if name.endswith('.py') and not name == '__init__.py']
+        if name.endswith('.py') and not name.startswith('_'))
+
+
+class DependencyError(Exception):
+    '''A fact module couldn't be run because of one of its DEPENDS'''
+
+
+def read_depends(file_path):
+    '''Returns the DEPENDS list declared by the fact module at file_path,
+    read from its source without loading it, or an empty list'''
+    try:
+        with open(file_path, 'rb') as file:
+            source = file.read()
+        if b'DEPENDS' not in source:
+            # most modules don't declare any; don't parse them
+            return []
+        for node in ast.parse(source, file_path).body:
+            if (isinstance(node, ast.Assign) and
+                    any(isinstance(target, ast.Name) and
+                        target.id == 'DEPENDS' for target in node.targets)):
+                depends = ast.literal_eval(node.value)
+                if (isinstance(depends, (list, tuple)) and
+                        all(isinstance(name, str) for name in depends)):
+                    return list(depends)
+    except (IOError, OSError, SyntaxError, ValueError):
+        # a module that can't be read or parsed fails when it is loaded
+        pass
+    return []
+
+
+def check_dependencies(depends, available):
+    '''Returns a dict mapping the name of each fact module in depends, a dict
+    of module name -> DEPENDS, that can't be run to the reason why: it
+    depends on something that isn't a fact module or in `available`, on
+    itself through other modules, or on a module that can't be run'''
+    errors = {}
+    # modules being visited, and modules known to be fine
+    visiting = []
+    checked = set()
+
+    def visit(name):
+        '''Checks name and everything it depends on'''
+        if name in checked or name in errors:
+            return
+        if name in visiting:
+            cycle = visiting[visiting.index(name):] + [name]
+            for member in cycle[:-1]:
+                errors[member] = ('Dependency cycle: %s' % ' -> '.join(cycle))
+            return
+        visiting.append(name)
+        for dependency in depends[name]:
+            if dependency in depends:
+                visit(dependency)
+                if dependency in errors and name not in errors:
+                    errors[name] = ('Depends on %s, which can\'t be run'
+                                    % dependency)
+            elif dependency not in available and name not in errors:
+                errors[name] = 'Unknown dependency %s' % dependency
+        visiting.pop()
+        checked.add(name)
+
+    for name in sorted(depends):
+        visit(name)
+    return errors
+
+
+def select_modules(depends, only=None, exclude=None):
+    '''Returns the sorted names of the fact modules in depends, a dict of
+    module name -> DEPENDS, to run: those in only, or all of them if it is
+    None, along with the fact modules they depend on, less those in exclude.
+    Raises ValueError if only or exclude names a module that doesn't
+    exist.'''
+    unknown = sorted((set(only or []) | set(exclude or [])) - set(depends))
+    if unknown:
+        raise ValueError('No such fact module: %s' % ', '.join(unknown))
+    selected = set(depends if only is None else only)
+    pending = list(selected)
+    while pending:
+        for dependency in depends[pending.pop()]:
+            if dependency in depends and dependency not in selected:
+                selected.add(dependency)
+                pending.append(dependency)
+    return sorted(selected - set(exclude or []))
+
+
+def load_fact_module(name, file_path):
+    '''Loads and returns a fact module'''
+    # Python 3.4 and higher only
+    spec = importlib.util.spec_from_file_location(name, file_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def fact_worker(name, file_path, messages, module=None, depends=None):
+    '''Loads and runs a fact module on a worker thread, or just runs module if
+    it has already been loaded, passing it the values of its DEPENDS in the
+    dict depends. Sends a 'loaded' message with the module's TIMEOUT once it
+    is loaded, then a 'done' message with the module, its fact() result, any
+    exception, a dict of timings, the fingerprints of the module's INPUTS
+    taken before fact() ran, and its CACHE_TTL.'''
+    _command.set_owner(name)
+    result = error = inputs = None
+    timings = {}
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        if module is None:
+            module = load_fact_module(name, file_path)
+        timings['import_seconds'] = time.perf_counter() - start
+        messages.put(('loaded', name, getattr(module, 'TIMEOUT', None)))
+        if getattr(module, 'INPUTS', None):
+            # taken first, so a change made while fact() runs is noticed
+            inputs = input_fingerprints(module.INPUTS)
+        fact_start = time.perf_counter()
+        kwargs = dict(depends or {})
+        if getattr(module, 'COMMANDS', None):
+            # start the module's commands together on the command loop
+            kwargs['commands'] = _command.run_commands(module.COMMANDS)
+        result = module.fact(**kwargs)
+        timings['fact_seconds'] = time.perf_counter() - fact_start
+    # pylint: disable=broad-except
+    except BaseException as err:
+        error = err
+    # pylint: enable=broad-except
+    timings['cpu_seconds'] = time.thread_time() - cpu_start
+    timings.update(_command.usage(name))
+    messages.put(('done', name, module, result, error, timings, inputs,
+                  getattr(module, 'CACHE_TTL', 0)))
+
+
+def probe_worker(name, messages):
+    '''Runs the probe name from _probe.PROBES on a worker thread and sends a
+    'done' message with its value in the same form as fact_worker()'''
+    _command.set_owner(name)
+    result = error = None
+    start = time.perf_counter()
+    try:
+        result = importlib.import_module('facts._probe').PROBES[name]()
+    # pylint: disable=broad-except
+    except BaseException as err:
+        error = err
+    # pylint: enable=broad-except
+    messages.put(('done', name, None, result, error,
+                  {'fact_seconds': time.perf_counter() - start}, None, 0))
+
+
+class IsolatedError(Exception):
+    '''A fact module running in a worker process failed, or the worker
+    did'''
+
+
+class WorkerReplies(object):
+    '''Stands in for the message queue fact_worker() reports to when it runs
+    in a worker process: passes the 'loaded' message on to the parent, and
+    keeps the 'done' message to be sent once the worker has decided whether
+    to retire'''
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.done = None
+
+    def put(self, message):
+        '''Handles a message from fact_worker()'''
+        if message[0] == 'loaded':
+            reply = {'loaded': True}
+            if message[2] is not None:
+                reply['timeout'] = message[2]
+            self.conn.send_bytes(plistlib.dumps(reply,
+                                                fmt=plistlib.FMT_BINARY))
+        else:
+            self.done = message
+
+
+def pool_worker(conn, max_tasks, max_rss):
+    '''Runs fact modules in a worker process: receives (name, file_path,
+    depends) tasks on conn and answers each with a binary plist of the
+    module's result, or its error, timings, INPUTS fingerprints and
+    CACHE_TTL. Exits when conn is closed, or after answering a task when it
+    has run max_tasks or its peak memory use has passed max_rss bytes.'''
+    def stop(signum, frame):
+        '''Kills the commands of a module that has run out of time'''
+        # the worker runs one module at a time, so every command is its
+        _command.kill_all()
+        os._exit(1)  # pylint: disable=protected-access
+
+    signal.signal(signal.SIGTERM, stop)
+    # path -> [fingerprint, module]; modules stay loaded between tasks
+    modules = {}
+    for task in range(1, max_tasks + 1):
+        try:
+            name, file_path, depends = conn.recv()
+        except EOFError:
+            return
+        _command.reset()
+        if 'facts._probe' in sys.modules:
+            sys.modules['facts._probe'].reset()
+        fingerprint = file_fingerprint(file_path)
+        module = None
+        if file_path in modules and modules[file_path][0] == fingerprint:
+            module = modules[file_path][1]
+        replies = WorkerReplies(conn)
+        fact_worker(name, file_path, replies, module, depends)
+        _, _, module, result, error, timings, inputs, ttl = replies.done
+        if module is not None:
+            modules[file_path] = [fingerprint, module]
+
+        max_rss_used = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != 'darwin':
+            # kilobytes everywhere but macOS
+            max_rss_used *= 1024
+        reply = {'timings': timings,
+                 'retire': task == max_tasks or max_rss_used > max_rss}
+        if inputs:
+            reply['inputs'] = inputs
+        if ttl:
+            reply['cache_ttl'] = ttl
+        if error is None:
+            try:
+                reply['result'] = normalize_result(result)
+            except (AttributeError, TypeError, ValueError) as err:
+                error = err
+        if error is not None:
+            reply.pop('result', None)
+            reply['error'] = str(error)
+        try:
+            data = plistlib.dumps(reply, fmt=plistlib.FMT_BINARY)
+        except (TypeError, OverflowError) as err:
+            reply.pop('result')
+            reply['error'] = 'Result can\'t be stored in a plist: %s' % err
+            data = plistlib.dumps(reply, fmt=plistlib.FMT_BINARY)
+        conn.send_bytes(data)
+        if reply['retire']:
+            return
+
+
+class WorkerPool(object):
+    '''A pool of worker processes that run fact modules, so a module that
+    crashes, hangs or leaks memory only takes its worker with it. Workers
+    are forked from a forkserver that has already imported the code shared
+    by fact modules, and are replaced after running max_tasks modules or
+    once their peak memory use passes max_rss bytes.'''
 
-    for name in fact_files:
-        # load each file and call its fact() function
-        file_path = os.path.join(module_dir, name + '.py')
+    def __init__(self, size, max_tasks=DEFAULT_WORKER_MAX_TASKS,
+                 max_rss=DEFAULT_WORKER_MAX_RSS):
+        self.max_tasks = max_tasks
+        self.max_rss = max_rss
+        # only imported with --isolate, since it slows down every start
+        # pylint: disable=import-outside-toplevel
+        import multiprocessing
+        # pylint: enable=import-outside-toplevel
+        self.context = multiprocessing.get_context('forkserver')
+        # the main module, and this one, which pool_worker() is in, are
+        # imported once by the forkserver rather than by every worker
+        self.context.set_forkserver_preload(
+            ['__main__', __name__] + WORKER_PRELOAD)
+        self.lock = threading.Lock()
+        # module name -> the worker running it
+        self.busy = {}
+        self.idle = [self.start_worker() for _ in range(size)]
+
+    def start_worker(self):
+        '''Starts a worker process and returns it and the parent's end of
+        its pipe'''
+        conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=pool_worker,
+            args=(child_conn, self.max_tasks, self.max_rss),
+            name='munki_facts worker', daemon=True)
+        process.start()
+        child_conn.close()
+        return process, conn
+
+    def run(self, name, file_path, messages, depends=None):
+        '''Runs a fact module in a worker, on a thread of the parent, and
+        sends the same messages as fact_worker(); the module itself isn't
+        sent back, so it is None'''
+        with self.lock:
+            worker = self.idle.pop() if self.idle else None
+        if worker is None:
+            worker = self.start_worker()
+        with self.lock:
+            self.busy[name] = worker
+        process, conn = worker
+        reply = {}
+        try:
+            conn.send((name, file_path, depends or {}))
+            while True:
+                reply = plistlib.loads(conn.recv_bytes())
+                if not reply.get('loaded'):
+                    break
+                messages.put(('loaded', name, reply.get('timeout')))
+        except (EOFError, OSError):
+            process.join(1)
+            reply = {'error': 'Worker process exited with status %s'
+                              % process.exitcode, 'retire': True}
+        with self.lock:
+            del self.busy[name]
+            if reply.get('retire') or not process.is_alive():
+                conn.close()
+                process.join(1)
+            else:
+                self.idle.append(worker)
+        error = None
+        if 'error' in reply:
+            error = IsolatedError(reply['error'])
+        messages.put(('done', name, None, reply.get('result'), error,
+                      reply.get('timings', {}), reply.get('inputs'),
+                      reply.get('cache_ttl', 0)))
+
+    def kill(self, name):
+        '''Stops the worker running fact module name, and the commands it
+        started'''
+        with self.lock:
+            worker = self.busy.get(name)
+        if worker is not None:
+            worker[0].terminate()
+
+    def close(self):
+        '''Stops every worker'''
+        with self.lock:
+            workers = self.idle + list(self.busy.values())
+            self.idle = []
+        for process, conn in workers:
+            # an idle worker exits when its pipe is closed
+            conn.close()
+        for process, _ in workers:
+            process.join(1)
+            if process.is_alive():
+                process.kill()
+
+
+def run_fact_modules(names, paths, workers, fact_timeout, deadline,
+                     modules=None, depends=None, values=None, expected=None,
+                     pool=None):
+    '''Runs the named fact modules, up to `workers` at a time, each on its own
+    daemon thread. Modules in `modules`, a dict mapping names to modules that
+    are already loaded, aren't loaded again. A module that runs past its
+    TIMEOUT (or fact_timeout) has the commands it started killed and is
+    abandoned, as is everything still running or waiting to run at the
+    deadline, a time.monotonic() value, so that the clock being set doesn't
+    cut modules off early or let them run on.
+
+    Names that aren't in paths are probes from _probe.PROBES. depends maps
+    names to the names they depend on: each waits for those to finish, then
+    gets their values, or their values from `values` if they are known
+    already. One that depends on something that failed isn't run, and
+    finishes with a DependencyError.
+
+    expected maps names to the seconds they are expected to take; one isn't
+    started with less time than that left before the deadline, since it
+    would only be killed.
+
+    If pool, a WorkerPool, is given, the modules run in its worker processes
+    rather than in this one, and a module that runs out of time has its
+    worker stopped.
+
+    Returns a dict mapping the name of each module that finished in time to a
+    (module, result, error, timings, inputs, cache_ttl) tuple, and a dict
+    mapping the name of each module that didn't to a (seconds, timed_out)
+    tuple: the number of seconds it ran for, or None if it never started, and
+    whether it ran past its own timeout rather than being stopped at the
+    deadline.'''
+    modules = modules or {}
+    depends = depends or {}
+    values = dict(values or {})
+    expected = expected or {}
+    messages = queue.Queue()
+    waiting = list(names)
+    # name -> [start time, timeout]
+    running = {}
+    finished = {}
+    unfinished = {}
+    # something that isn't going to run and has no value can't be waited for
+    failed = set(dependency for name in names
+                 for dependency in depends.get(name, ())
+                 if dependency not in values and dependency not in names)
+    checked_failures = 0
+    while waiting or running:
+        # anything that depends on something that failed can't run, nor can
+        # anything that depends on that
+        while len(failed) > checked_failures:
+            checked_failures = len(failed)
+            for name in [name for name in waiting
+                         if failed.intersection(depends.get(name, ()))]:
+                error = DependencyError('Depends on %s, which failed' % (
+                    ', '.join(sorted(failed.intersection(depends[name])))))
+                waiting.remove(name)
+                failed.add(name)
+                finished[name] = (None, None, error, {}, None, 0)
+
+        index = 0
+        while (index < len(waiting) and len(running) < workers and
+               time.monotonic() < deadline):
+            name = waiting[index]
+            if (not all(dependency in values
+                        for dependency in depends.get(name, ())) or
+                    time.monotonic() + expected.get(name, 0) > deadline):
+                index += 1
+                continue
+            del waiting[index]
+            running[name] = [time.monotonic(), fact_timeout]
+            arguments = dict((dependency, values[dependency])
+                             for dependency in depends.get(name, ()))
+            if name in paths and pool is not None:
+                target = pool.run
+                args = (name, paths[name], messages, arguments)
+            elif name in paths:
+                target = fact_worker
+                args = (name, paths[name], messages, modules.get(name),
+                        arguments)
+            else:
+                target = probe_worker
+                args = (name, messages)
+            thread = threading.Thread(target=target, args=args, name=name,
+                                      daemon=True)
+            thread.start()
+        if not running:
+            break
+
+        wake = min([deadline] + [start + timeout
+                                 for start, timeout in running.values()])
         try:
-            # Python 3.4 and higher only
-            spec = importlib.util.spec_from_file_location(name, file_path)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-            facts.update(module.fact())
+            message = messages.get(timeout=max(0, wake - time.monotonic()))
+        except queue.Empty:
+            message = None
+        if message and message[1] in running:
+            if message[0] == 'loaded' and message[2] is not None:
+                running[message[1]][1] = message[2]
+            elif message[0] == 'done':
+                del running[message[1]]
+                finished[message[1]] = message[2:]
+                if message[4] is None:
+                    values[message[1]] = message[3]
+                else:
+                    failed.add(message[1])
+
+        now = time.monotonic()
+        for name, (start, timeout) in list(running.items()):
+            timed_out = now - start >= timeout
+            if now >= deadline or timed_out:
+                print(u'Fact module %s timed out after running for %.1f '
+                      u'seconds' % (name, now - start), file=sys.stderr)
+                _command.kill(name)
+                if pool is not None:
+                    pool.kill(name)
+                del running[name]
+                unfinished[name] = (now - start, timed_out)
+                failed.add(name)
+
+    for name in waiting:
+        print(u'Fact module %s was not run because there wasn\'t time'
+              % name, file=sys.stderr)
+        unfinished[name] = (None, False)
+    return finished, unfinished
+
+
+def normalize_result(result):
+    '''Returns a copy of a fact() result with None values converted to
+    empty strings, since None can't be stored in a plist'''
+    return dict((key, '' if value is None else value)
+                for key, value in result.items())
+
+
+def file_fingerprint(path):
+    '''Returns a list that changes whenever the file at path is modified or
+    replaced, or None if there is no file at path'''
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return [info.st_mtime_ns, info.st_size, info.st_ino]
+
+
+def input_fingerprints(paths):
+    '''Returns a dict mapping each of paths to its file_fingerprint(), or to
+    an empty list if there is nothing at that path'''
+    return dict((path, file_fingerprint(path) or []) for path in paths)
+
+
+def load_cache(cache_path):
+    '''Returns what is kept in the cache at cache_path, as a dict: the
+    results of the fact modules as 'modules', the run time history of each
+    as 'history', and the record of those that have been failing as
+    'failures'. The results and failures are discarded when the OS version
+    changes, since many facts depend on it; the history is kept. Everything
+    is empty if cache_path is None.'''
+    state = {'modules': {}, 'history': {}, 'failures': {}}
+    if cache_path is None:
+        return state
+    try:
+        with open(cache_path, 'rb') as file:
+            cache = plistlib.load(file)
+    except (IOError, OSError, ExpatError, plistlib.InvalidFileException):
+        return state
+    if (not isinstance(cache, dict) or
+            cache.get('version') != CACHE_FORMAT_VERSION):
+        return state
+    state['history'] = cache.get('history', {})
+    if cache.get('os_release') == os.uname().release:
+        state['modules'] = cache.get('modules', {})
+        state['failures'] = cache.get('failures', {})
+    return state
+
+
+def save_cache(cache_path, entries, history=None, failures=None):
+    '''Writes fact module results, their run time history and the record of
+    failing modules to cache_path'''
+    cache = {'version': CACHE_FORMAT_VERSION,
+             'os_release': os.uname().release,
+             'modules': entries,
+             'history': history or {},
+             'failures': failures or {}}
+    try:
+        atomic_write(cache_path,
+                     plistlib.dumps(cache, fmt=plistlib.FMT_BINARY))
+    except (IOError, OSError, TypeError, OverflowError) as err:
+        print('Couldn\'t save fact cache: %s' % err, file=sys.stderr)
+
+
+def record_failure(entry, error, now, source):
+    '''Returns a module's failure record with another failure, error, added.
+    Once a module has failed FAILURE_THRESHOLD runs in a row, it isn't run
+    again until retry_at: BACKOFF_SECONDS later, doubling with each failure
+    after that up to MAX_BACKOFF_SECONDS. source is the fingerprint of the
+    module's file; failures of an earlier version of it don't count.'''
+    if entry is not None and entry.get('source') != source:
+        entry = None
+    count = (entry or {}).get('count', 0) + 1
+    backoff = 0
+    if count >= FAILURE_THRESHOLD:
+        backoff = min(BACKOFF_SECONDS * 2 ** (count - FAILURE_THRESHOLD),
+                      MAX_BACKOFF_SECONDS)
+    record = {'count': count, 'error': error, 'failed_at': now,
+              'retry_at': now + backoff}
+    if source is not None:
+        record['source'] = source
+    return record
+
+
+def is_circuit_open(entry, now, source):
+    '''Returns True if a module with failure record entry should be skipped
+    for now. A module whose file, with fingerprint source, has changed since
+    it failed is run again straight away.'''
+    return (entry is not None and entry['count'] >= FAILURE_THRESHOLD and
+            now < entry['retry_at'] and entry.get('source') == source)
+
+
+def percentile(samples, fraction):
+    '''Returns the value below which `fraction` of samples fall, by the
+    nearest rank method'''
+    ordered = sorted(samples)
+    return ordered[max(0, int(math.ceil(fraction * len(ordered))) - 1)]
+
+
+def update_history(entry, seconds):
+    '''Returns a module's run time history entry with another run of
+    `seconds` added. Each entry has a moving average of the module's run
+    times, weighted towards recent runs, its last few run times, and the
+    number of runs recorded.'''
+    if not entry:
+        return {'ewma': seconds, 'samples': [seconds], 'runs': 1}
+    return {'ewma': (HISTORY_WEIGHT * seconds +
+                     (1 - HISTORY_WEIGHT) * entry['ewma']),
+            'samples': (entry['samples'] + [seconds])[-HISTORY_SAMPLES:],
+            'runs': entry['runs'] + 1}
+
+
+def schedule_order(names, depends, history):
+    '''Returns names, fact modules and probes, in the order they should be
+    started: those expected to hold up the end of the run longest first.
+    That is how long each is expected to run, by its history, plus the
+    longest the things that depend on it are expected to run after it.
+    Modules with no history are expected to be as slow as the slowest module
+    that has one; probes are expected to be instant.'''
+    known = [history[name]['ewma'] for name in names if name in history]
+    unknown = max(known) if known else 0
+    dependents = {}
+    for name in names:
+        for dependency in depends.get(name, ()):
+            dependents.setdefault(dependency, []).append(name)
+    ranks = {}
+
+    def rank(name):
+        '''Returns how long the run is expected to last once name starts'''
+        if name not in ranks:
+            own = 0
+            if name in depends:
+                own = history.get(name, {}).get('ewma', unknown)
+            ranks[name] = own + max(
+                [rank(dependent) for dependent in dependents.get(name, ())] or
+                [0])
+        return ranks[name]
+
+    # sorted() is stable, so modules expected to take as long as each other
+    # start in the order they were given
+    return sorted(names, key=lambda name: -rank(name))
+
+
+def inputs_unchanged(entry):
+    '''Returns True if none of the INPUTS recorded in a cache entry have
+    changed since'''
+    inputs = entry['inputs']
+    # a file changed twice within the resolution of its modification time
+    # could look unchanged, so one modified that close to when the
+    # fingerprints were taken isn't trusted
+    racy = (entry.get('timestamp', 0) - INPUT_MTIME_RESOLUTION) * 1e9
+    return (inputs == input_fingerprints(inputs) and
+            not any(fingerprint and fingerprint[0] >= racy
+                    for fingerprint in inputs.values()))
+
+
+def is_fresh(entry, file_path, now):
+    '''Returns True if a cache entry can be used instead of running the fact
+    module at file_path'''
+    if entry.get('source') != file_fingerprint(file_path):
+        return False
+    ttl = entry.get('ttl', 0)
+    within_ttl = 0 <= now - entry.get('timestamp', 0) < ttl
+    if entry.get('inputs'):
+        # good until an input changes, or its CACHE_TTL runs out if it has
+        # one
+        return inputs_unchanged(entry) and (ttl <= 0 or within_ttl)
+    return ttl > 0 and within_ttl
+
+
+def run_facts(module_dir, workers=DEFAULT_WORKERS, cache_path=None,
+              fact_timeout=DEFAULT_FACT_TIMEOUT, timeout=DEFAULT_RUN_TIMEOUT,
+              modules=None, budget=None, pool=None, only=None, exclude=None):
+    '''Runs every fact module in module_dir, up to `workers` of them at the
+    same time, and returns the merged facts. Results are merged in module name
+    order no matter what order the modules finish in.
+
+    If cache_path is given, modules whose cached result is younger than their
+    CACHE_TTL are not loaded or run at all, nor are modules none of whose
+    INPUTS have changed since they last ran, and the results of the modules
+    that did run are saved for the next time. So is a history of how long
+    each module takes, and the modules expected to take longest are started
+    first.
+
+    Each module may run for its TIMEOUT, or fact_timeout seconds if it doesn't
+    set one, and the whole run for timeout seconds. Modules that run out of
+    time are left out of the results.
+
+    If budget is given, the run takes no more than budget seconds. Modules
+    are run from the one whose cached result is oldest, and those that
+    aren't run in time, or are expected to take longer than the time left,
+    keep their cached result. Their status has the result's age.
+
+    A module that lists other fact modules, or probes from _probe.PROBES, in
+    its DEPENDS only runs once they have, and gets their values as keyword
+    arguments to fact(): a module's result dict, or a probe's value. Modules
+    that depend on something that doesn't exist, or on themselves, are
+    reported and not run.
+
+    If only is given, just the modules it names, and the modules they depend
+    on, are run; modules named in exclude are not. The facts returned come
+    from those modules alone, and the cached results of the others are kept.
+
+    modules is a dict, kept by the caller between runs, that this fills in
+    with the modules it loads; a module whose file hasn't changed since is
+    not loaded again. If pool, a WorkerPool, is given, the modules run in
+    its worker processes instead, and are kept loaded there.
+
+    Returns the facts, and a dict with the status and timings of each
+    module.'''
+    _command.reset()
+    # the shared probes are only loaded if a fact module has used them
+    if 'facts._probe' in sys.modules:
+        sys.modules['facts._probe'].reset()
+    deadline = time.monotonic() + min(timeout, budget or timeout)
+    fact_files = get_fact_files(module_dir)
+    paths = dict((name, os.path.join(module_dir, name + '.py'))
+                 for name in fact_files)
+    results = {}
+    status = {}
+
+    depends = dict((name, read_depends(paths[name])) for name in fact_files)
+    selected = select_modules(depends, only, exclude)
+    probes = []
+    if any(dependency not in depends
+           for name in selected for dependency in depends[name]):
+        probes = importlib.import_module('facts._probe').PROBES
+    errors = check_dependencies(depends, probes)
+    excluded = True
+    while excluded:
+        # a module can't run without a module that was excluded
+        excluded = False
+        for name in selected:
+            for dependency in depends[name]:
+                if (name not in errors and dependency in depends and
+                        (dependency not in selected or dependency in errors)):
+                    errors[name] = ('Depends on %s, which isn\'t being run'
+                                    % dependency)
+                    excluded = True
+    errors = dict((name, errors[name]) for name in selected if name in errors)
+    for name in sorted(errors):
+        print(u'Fact module %s can\'t be run: %s' % (name, errors[name]),
+              file=sys.stderr)
+        status[name] = {'status': 'error', 'cached': False,
+                        'error': errors[name]}
+
+    state = load_cache(cache_path)
+    cache, history, failures = (
+        state['modules'], state['history'], state['failures'])
+    now = time.time()
+    to_run = []
+    for name in selected:
+        if name in errors:
+            continue
+        if name in cache and is_fresh(cache[name], paths[name], now):
+            results[name] = cache[name]['result']
+            status[name] = {'status': 'cached', 'cached': True,
+                            'age_seconds': now - cache[name]['timestamp']}
+        elif is_circuit_open(failures.get(name), now,
+                             file_fingerprint(paths[name])):
+            # it has been failing; don't spend time on it until retry_at,
+            # and use its last good result meanwhile
+            status[name] = {
+                'status': 'circuit_open', 'cached': False,
+                'failures': failures[name]['count'],
+                'retry_seconds': failures[name]['retry_at'] - now}
+            if name in cache:
+                results[name] = cache[name]['result']
+                status[name]['age_seconds'] = (
+                    now - cache[name]['timestamp'])
+        else:
+            to_run.append(name)
+
+    loaded = {}
+    if modules is not None:
+        fingerprints = dict((name, file_fingerprint(paths[name]))
+                            for name in fact_files)
+        for name in list(modules):
+            if modules[name][0] != fingerprints.get(name):
+                del modules[name]
+        loaded = dict((name, modules[name][1]) for name in to_run
+                      if name in modules)
+
+    # the probes the modules to run depend on run alongside them, and cached
+    # results stand in for the modules that don't need to run
+    needed = sorted(set(dependency for name in to_run
+                        for dependency in depends[name]
+                        if dependency not in depends))
+    order = schedule_order(needed + to_run, depends, history)
+    expected = {}
+    # results from earlier runs, served under a budget for the modules that
+    # aren't run in time
+    stale = {}
+    if budget is not None:
+        # serve what every module found last time, and refresh as many of
+        # them as there is time for
+        ages = {}
+        for name in to_run:
+            if name in cache:
+                stale[name] = cache[name]['result']
+                ages[name] = now - cache[name]['timestamp']
+        order = budget_order(order, depends, ages)
+        expected = dict((name, history[name]['ewma']) for name in ages
+                        if name in history)
+    # a module that runs gets the values its dependencies have in this run,
+    # never their stale results
+    finished, unfinished = run_fact_modules(
+        order, paths, workers, fact_timeout, deadline, loaded, depends,
+        results, expected, pool)
+    for name in needed:
+        if name in finished and finished[name][2] is not None:
+            print(u'Error %s in probe %s' % (finished[name][2], name),
+                  file=sys.stderr)
+    for name, (seconds, timed_out) in unfinished.items():
+        if name not in paths:
+            continue
+        if modules is not None:
+            # it may still be running; don't run it again at the same time
+            modules.pop(name, None)
+        status[name] = {'status': 'not_run', 'cached': False}
+        if seconds is not None:
+            status[name].update(status='timeout', fact_seconds=seconds)
+            # it took at least this long
+            history[name] = update_history(history.get(name), seconds)
+        if timed_out:
+            # only running past its own timeout counts against a module, not
+            # being stopped because the run or its budget ran out of time
+            failures[name] = record_failure(
+                failures.get(name),
+                'Timed out after %.1f seconds' % seconds, now,
+                file_fingerprint(paths[name]))
+            status[name]['failures'] = failures[name]['count']
+        if name in stale:
+            results[name] = stale[name]
+            status[name].update(
+                age_seconds=now - cache[name]['timestamp'])
+    for name in to_run:
+        if name not in finished:
+            continue
+        module, result, error, timings, inputs, ttl = finished[name]
+        status[name] = dict(timings, status='ok', cached=False)
+        if 'fact_seconds' in timings:
+            history[name] = update_history(
+                history.get(name),
+                timings['import_seconds'] + timings['fact_seconds'])
+        if modules is not None and module is not None:
+            modules[name] = [fingerprints[name], module]
+        try:
+            if error:
+                raise error
+            results[name] = normalize_result(result)
         # pylint: disable=broad-except
         except BaseException as err:
-            print(u'Error %s in file %s' % (err, file_path), file=sys.stderr)
+            print(u'Error %s in file %s' % (err, paths[name]), file=sys.stderr)
+            status[name].update(status='error', error=str(err))
+            results.pop(name, None)
+            if not isinstance(err, DependencyError):
+                failures[name] = record_failure(
+                    failures.get(name), str(err), now,
+                    file_fingerprint(paths[name]))
+                status[name]['failures'] = failures[name]['count']
+            continue
         # pylint: enable=broad-except
+        failures.pop(name, None)
+        cache[name] = {'result': results[name],
+                       'timestamp': time.time(),
+                       'ttl': ttl,
+                       'source': file_fingerprint(paths[name])}
+        if inputs:
+            cache[name]['inputs'] = inputs
+
+    if cache_path:
+        # forget about modules that have been removed
+        save_cache(cache_path,
+                   dict((name, cache[name])
+                        for name in fact_files if name in cache),
+                   dict((name, history[name])
+                        for name in fact_files if name in history),
+                   dict((name, failures[name])
+                        for name in fact_files if name in failures))
+
+    facts = {}
+    for name in selected:
+        if name in results:
+            facts.update(results[name])
+    return facts, status
+
+
+def budget_order(names, depends, ages):
+    '''Returns names, fact modules and probes, in the order they should be
+    started when there isn't time for all of them: probes, which other
+    modules are waiting for, then modules with no earlier result, then the
+    rest from the one whose result is oldest, by ages, a dict of the age in
+    seconds of each module's last result'''
+    return sorted(names, key=lambda name: (
+        name in depends, name in ages, -ages.get(name, 0)))
+
+
+def format_stats(history):
+    '''Returns the run time history of each fact module as a table, slowest
+    first: the order the modules are started in when nothing else decides
+    it'''
+    lines = ['%-32s %6s %10s %10s %10s' % (
+        'module', 'runs', 'last ms', 'ewma ms', 'p95 ms')]
+    for name in sorted(history, key=lambda name: -history[name]['ewma']):
+        entry = history[name]
+        lines.append('%-32s %6d %10.1f %10.1f %10.1f' % (
+            name, entry['runs'], entry['samples'][-1] * 1000,
+            entry['ewma'] * 1000, percentile(entry['samples'], 0.95) * 1000))
+    return '\n'.join(lines)
+
+
+def format_circuits(failures, module_dir, now=None):
+    '''Returns a table of the fact modules in module_dir that are being
+    skipped because they keep failing, with how many runs in a row each has
+    failed, when it will be tried again, and its last error'''
+    now = time.time() if now is None else now
+    lines = ['%-32s %8s %10s  %s' % ('module', 'failures', 'retry in',
+                                     'last error')]
+    for name in sorted(failures):
+        if is_circuit_open(failures[name], now, file_fingerprint(
+                os.path.join(module_dir, name + '.py'))):
+            lines.append('%-32s %8d %9.0fm  %s' % (
+                name, failures[name]['count'],
+                (failures[name]['retry_at'] - now) / 60,
+                failures[name]['error']))
+    if len(lines) == 1:
+        return 'No fact modules are being skipped.'
+    return '\n'.join(lines)
+
+
+def atomic_write(path, data):
+    '''Writes data to path through a temporary file in the same directory, so
+    readers see either the old contents or the new, never part of either'''
+    temp_path = '%s.%s.tmp' % (path, os.getpid())
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.rename(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
 
-    if facts:
-        # Handle cases when facts return None - convert them to empty
-        # strings.
-        for key, value in facts.items():
-            if value is None:
-                facts[key] = ''
-        # Read the location of the ManagedInstallDir from ManagedInstall.plist
-        bundle_id = 'ManagedInstalls'
-        pref_name = 'ManagedInstallDir'
-        managedinstalldir = CFPreferencesCopyAppValue(pref_name, bundle_id)
-        conditionalitemspath = os.path.join(
-            managedinstalldir, 'ConditionalItems.plist')
 
+def write_conditional_items(path, facts, binary=False):
+    '''Merges facts into the conditional items in the plist at path. The file
+    is only written if that changes it, and then atomically, so Munki never
+    sees a partly written file. Returns True if the file was written.'''
+    current = b''
+    conditional_items = {}
+    try:
+        with open(path, 'rb') as file:
+            current = file.read()
+        conditional_items = plistlib.loads(current)
+    except (IOError, OSError, ExpatError, plistlib.InvalidFileException):
+        pass
+    if not isinstance(conditional_items, dict):
         conditional_items = {}
-        # read the current conditional items
-        if os.path.exists(conditionalitemspath):
+    conditional_items.update(facts)
+    data = plistlib.dumps(
+        conditional_items,
+        fmt=plistlib.FMT_BINARY if binary else plistlib.FMT_XML)
+    # comparing the serialized plists, rather than the dicts, also catches
+    # changes of type (1 == True) and of file format
+    if data == current:
+        return False
+    atomic_write(path, data)
+    return True
+
+
+def prometheus_label(value):
+    '''Escapes a Prometheus label value'''
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_prometheus_metrics(status, run_seconds, timestamp):
+    '''Returns the status of a run in the Prometheus text format'''
+    lines = [
+        '# HELP munki_facts_run_seconds Wall time of the whole run.',
+        '# TYPE munki_facts_run_seconds gauge',
+        'munki_facts_run_seconds %r' % run_seconds,
+        '# HELP munki_facts_last_run_timestamp_seconds When the run finished.',
+        '# TYPE munki_facts_last_run_timestamp_seconds gauge',
+        'munki_facts_last_run_timestamp_seconds %r' % timestamp,
+        '# HELP munki_facts_module_status Status of each fact module: ok, '
+        'cached, error, timeout or not_run.',
+        '# TYPE munki_facts_module_status gauge',
+    ]
+    names = sorted(status)
+    for name in names:
+        lines.append('munki_facts_module_status{module="%s",status="%s"} 1'
+                     % (prometheus_label(name), status[name]['status']))
+    for metric, description in MODULE_METRICS:
+        lines.append('# HELP munki_facts_module_%s %s' % (metric, description))
+        lines.append('# TYPE munki_facts_module_%s gauge' % metric)
+        for name in names:
+            value = status[name].get(metric, 0)
+            lines.append('munki_facts_module_%s{module="%s"} %r'
+                         % (metric, prometheus_label(name), float(value)))
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(metrics_dir, status, run_seconds):
+    '''Writes the status and timings of each module to metrics_dir as a JSON
+    report and a Prometheus textfile'''
+    timestamp = time.time()
+    report = {'timestamp': timestamp, 'run_seconds': run_seconds,
+              'modules': status}
+    try:
+        atomic_write(os.path.join(metrics_dir, METRICS_JSON_FILENAME),
+                     json.dumps(report, indent=2, sort_keys=True,
+                                default=str).encode('utf-8'))
+        atomic_write(os.path.join(metrics_dir, METRICS_PROM_FILENAME),
+                     format_prometheus_metrics(
+                         status, run_seconds, timestamp).encode('utf-8'))
+    except (IOError, OSError) as err:
+        print('Couldn\'t save metrics: %s' % err, file=sys.stderr)
+
+
+def recv_all(conn, limit=None):
+    '''Reads from a socket until the other end shuts down its side'''
+    chunks = []
+    size = 0
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            return b''.join(chunks)
+        size += len(chunk)
+        if limit and size > limit:
+            raise ValueError('Request is too large')
+        chunks.append(chunk)
+
+
+class CollectionLock(object):
+    '''An exclusive lock, shared by every munki_facts.py process, on
+    collecting facts into a ManagedInstallDir, so only one process at a time
+    runs the fact modules and updates ConditionalItems.plist. The process
+    holding it leaves what it collected in the lock file, so a process that
+    was waiting can use that instead of running the modules again.'''
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def acquire(self, timeout):
+        '''Waits up to timeout seconds for the lock, and returns True if it
+        was taken, or False if another process still held it. Raises OSError
+        if the lock file can't be opened or locked.'''
+        self.file = os.fdopen(
+            os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600), 'r+b')
+        deadline = time.monotonic() + timeout
+        while True:
             try:
-                with open(conditionalitemspath, "rb") as file:
-                    conditional_items = plistlib.load(file)
-            except (IOError, OSError, ExpatError) as err:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    self.file.close()
+                    self.file = None
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+            except OSError:
+                self.file.close()
+                self.file = None
+                raise
+
+    def take(self, timeout):
+        '''Waits up to timeout seconds for the lock, as acquire() does, and
+        returns True if it was taken. If it wasn't, says why on stderr, and
+        the caller goes ahead without it.'''
+        try:
+            if self.acquire(timeout):
+                return True
+            print('Another munki_facts.py is still running; collecting facts '
+                  'anyway', file=sys.stderr)
+        except (IOError, OSError) as err:
+            print('Couldn\'t lock %s: %s; collecting facts anyway'
+                  % (self.path, err), file=sys.stderr)
+        return False
+
+    def last_collection(self, newer_than):
+        '''Returns the facts, the status of each module, and how long the run
+        took, from the last process to hold the lock if its run finished
+        after newer_than, or None'''
+        try:
+            self.file.seek(0)
+            record = plistlib.loads(self.file.read())
+            if record['timestamp'] > newer_than:
+                return record['facts'], record['status'], record['run_seconds']
+        except (IOError, OSError, ExpatError, plistlib.InvalidFileException,
+                KeyError, TypeError, ValueError):
+            # nothing collected yet, or a process died writing it
+            pass
+        return None
+
+    def record(self, facts, status, run_seconds):
+        '''Leaves what this process collected for the next one to take the
+        lock'''
+        try:
+            data = plistlib.dumps(
+                {'facts': facts, 'status': status,
+                 'run_seconds': run_seconds, 'timestamp': time.time()},
+                fmt=plistlib.FMT_BINARY)
+            self.file.seek(0)
+            self.file.truncate()
+            self.file.write(data)
+            self.file.flush()
+        except (IOError, OSError, TypeError, OverflowError) as err:
+            print('Couldn\'t record the facts collected: %s' % err,
+                  file=sys.stderr)
+
+    def release(self):
+        '''Releases the lock'''
+        self.file.close()
+        self.file = None
+
+
+class FactsAgent(object):
+    '''Keeps the fact modules loaded and the latest facts in memory, and
+    serves them over a Unix domain socket. The modules are run on a schedule,
+    and whenever a client asks for facts newer than the ones the agent has.
+
+    A client sends a JSON object, {"max_age": seconds}, with "budget":
+    seconds if the run must be finished in that time, and "locked": true if
+    it holds the CollectionLock that the agent would otherwise take for a run
+    that uses the cache, and shuts down its side of the connection. The
+    agent answers with a binary plist holding the facts, the status of each
+    module, how long the run took and when it finished, or an error.'''
+
+    def __init__(self, module_dir, **run_options):
+        self.module_dir = module_dir
+        # passed to run_facts()
+        self.run_options = run_options
+        # kept loaded between runs
+        self.modules = {}
+        self.lock = threading.Lock()
+        self.reply = None
+        self.timestamp = None
+
+    def refresh(self, newer_than, budget=None, locked=False):
+        '''Runs the fact modules, within budget seconds if given, unless the
+        last run finished after newer_than, and returns the reply for
+        clients. The run holds the CollectionLock while it uses the cache,
+        unless the client asking holds it already (locked).'''
+        with self.lock:
+            if self.timestamp is not None and self.timestamp >= newer_than:
+                return self.reply
+        lock = None
+        cache_path = self.run_options.get('cache_path')
+        if cache_path and not locked:
+            # taken before self.lock, so a client holding it that asks for
+            # a run doesn't wait behind a run that waits for the client
+            lock = CollectionLock(os.path.join(os.path.dirname(cache_path),
+                                               LOCK_FILENAME))
+            if not lock.take(budget or self.run_options.get(
+                    'timeout', DEFAULT_RUN_TIMEOUT) + AGENT_REPLY_SLACK):
+                lock = None
+        try:
+            return self.run_modules(newer_than, budget)
+        finally:
+            if lock is not None:
+                lock.release()
+
+    def run_modules(self, newer_than, budget):
+        '''Runs the fact modules for refresh() unless another thread has
+        since'''
+        with self.lock:
+            if self.timestamp is None or self.timestamp < newer_than:
+                start = time.perf_counter()
+                facts, status = run_facts(
+                    self.module_dir, modules=self.modules, budget=budget,
+                    **self.run_options)
+                self.timestamp = time.time()
+                self.reply = plistlib.dumps(
+                    {'facts': facts, 'status': status,
+                     'run_seconds': time.perf_counter() - start,
+                     'timestamp': self.timestamp},
+                    fmt=plistlib.FMT_BINARY)
+            return self.reply
+
+    def handle(self, conn):
+        '''Answers one client'''
+        try:
+            with conn:
+                conn.settimeout(AGENT_REPLY_SLACK)
+                request = json.loads(
+                    recv_all(conn, MAX_AGENT_REQUEST).decode('utf-8') or '{}')
+                try:
+                    budget = request.get('budget')
+                    reply = self.refresh(
+                        time.time() - float(request.get('max_age', 0)),
+                        None if budget is None else float(budget),
+                        bool(request.get('locked')))
+                # pylint: disable=broad-except
+                except Exception as err:
+                    reply = plistlib.dumps({'error': str(err)})
+                # pylint: enable=broad-except
+                conn.sendall(reply)
+        except (OSError, ValueError, AttributeError) as err:
+            print('Couldn\'t answer a client: %s' % err, file=sys.stderr)
+
+    def run_on_schedule(self, interval):
+        '''Runs the fact modules now and every interval seconds after'''
+        while True:
+            try:
+                self.refresh(time.time())
+            # pylint: disable=broad-except
+            except Exception as err:
+                print('Scheduled run failed: %s' % err, file=sys.stderr)
+            # pylint: enable=broad-except
+            time.sleep(interval)
+
+    def serve(self, socket_path, interval):
+        '''Answers clients on socket_path, and runs the fact modules every
+        interval seconds, until the process is stopped'''
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            with probe:
+                probe.connect(socket_path)
+            raise OSError(errno.EADDRINUSE,
+                          'An agent is already listening on %s' % socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            pass
+        try:
+            # left behind by an agent that didn't shut down cleanly
+            os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
+        # only root, which Munki runs as, may connect
+        umask = os.umask(0o177)
+        try:
+            server.bind(socket_path)
+        finally:
+            os.umask(umask)
+        try:
+            server.listen(16)
+            threading.Thread(target=self.run_on_schedule, args=(interval,),
+                             name='schedule', daemon=True).start()
+            while True:
+                conn, _ = server.accept()
+                threading.Thread(target=self.handle, args=(conn,),
+                                 daemon=True).start()
+        finally:
+            server.close()
+            try:
+                os.unlink(socket_path)
+            except FileNotFoundError:
                 pass
 
-        # update the conditional items
-        conditional_items.update(facts)
 
-        # and write them out
+def request_facts(socket_path, max_age, timeout, budget=None, locked=False):
+    '''Asks the agent listening on socket_path for facts no more than max_age
+    seconds old, gathered within budget seconds if given. locked tells the
+    agent this process holds the CollectionLock for it. Returns the facts,
+    the status of each module, and how long the agent's run took. Raises
+    OSError, ValueError or ExpatError if there is no agent or it can't
+    answer.'''
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    with client:
+        client.connect(socket_path)
+        request = {'max_age': max_age}
+        if budget is not None:
+            request['budget'] = budget
+        if locked:
+            request['locked'] = True
+        client.sendall(json.dumps(request).encode('utf-8'))
+        client.shutdown(socket.SHUT_WR)
+        reply = plistlib.loads(recv_all(client))
+    if not isinstance(reply, dict) or 'facts' not in reply:
+        raise ValueError(reply.get('error', 'Bad reply from the agent')
+                         if isinstance(reply, dict) else
+                         'Bad reply from the agent')
+    return reply['facts'], reply['status'], reply['run_seconds']
+
+
+def copy_preference(key):
+    '''Returns the value of key in Munki's preferences from CFPreferences'''
+    # importing CoreFoundation takes longer than everything else the runner
+    # imports together, so it is only imported if it's needed
+    # pylint: disable=import-outside-toplevel,no-name-in-module
+    from CoreFoundation import CFPreferencesCopyAppValue
+    # pylint: enable=import-outside-toplevel,no-name-in-module
+    return CFPreferencesCopyAppValue(key, 'ManagedInstalls')
+
+
+def get_managed_install_dir(path=None):
+    '''Returns the location of the ManagedInstallDir: path if given, then
+    the directory in the environment, then the one in Munki's preferences
+    files. CFPreferences, which is slow to import, is only asked if a
+    preferences file can't be read.'''
+    path = path or os.environ.get(MANAGED_INSTALL_DIR_ENV)
+    if path:
+        return path
+    for prefs_path in PREFERENCES_FILES:
         try:
-            with open(conditionalitemspath, "wb") as file:
-                plistlib.dump(conditional_items, file)
+            with open(os.path.expanduser(prefs_path), 'rb') as file:
+                prefs = plistlib.load(file)
         except (IOError, OSError) as err:
-            print('Couldn\'t save conditional items: %s' % err, file=sys.stderr)
+            if err.errno == errno.ENOENT:
+                continue
+            break
+        except (ExpatError, plistlib.InvalidFileException, ValueError):
+            break
+        if not isinstance(prefs, dict):
+            break
+        if prefs.get('ManagedInstallDir'):
+            return prefs['ManagedInstallDir']
+    else:
+        return DEFAULT_MANAGED_INSTALL_DIR
+    return copy_preference('ManagedInstallDir') or DEFAULT_MANAGED_INSTALL_DIR
+
+
+# collect() keeps the fact modules it loads for its next call, and makes
+# calls from different threads take turns, since a run resets what _command
+# and _probe share between fact modules
+_collected_modules = {}
+_collect_lock = threading.Lock()
+
+
+def collect(only=None, exclude=None, parallel=DEFAULT_WORKERS, use_cache=True,
+            timeout=DEFAULT_RUN_TIMEOUT, fact_timeout=DEFAULT_FACT_TIMEOUT,
+            budget=None, managed_install_dir=None, pool=None):
+    '''Runs the fact modules in this process, up to `parallel` of them at the
+    same time, and returns the facts and a dict with the status and timings
+    of each module, as run_facts() does. Nothing is written to
+    ConditionalItems.plist, so other Python tools can get facts without
+    running munki_facts.py:
+
+        import munki_facts
+        facts, status = munki_facts.collect(only=['physical_or_virtual'])
+
+    only and exclude are lists of fact module names, as for run_facts(). If
+    use_cache is True, cached results are used, and updated, in
+    FactsCache.plist in managed_install_dir, found as munki_facts.py finds it
+    if not given. timeout, fact_timeout and budget are as for --timeout,
+    --fact-timeout and --budget, and pool is a WorkerPool to run the modules
+    in, as with --isolate. Modules stay loaded between calls, and are loaded
+    again only when their files change.'''
+    if parallel < 1:
+        raise ValueError('parallel must be 1 or greater')
+    run_options = {'workers': parallel, 'fact_timeout': fact_timeout,
+                   'timeout': timeout, 'budget': budget, 'pool': pool,
+                   'only': only, 'exclude': exclude}
+    with _collect_lock:
+        if not use_cache:
+            return collect_facts(None, **run_options)
+        managedinstalldir = get_managed_install_dir(managed_install_dir)
+        # the cache is shared with munki_facts.py, so take turns with it
+        lock = CollectionLock(os.path.join(managedinstalldir, LOCK_FILENAME))
+        locked = lock.take(budget or timeout + AGENT_REPLY_SLACK)
+        try:
+            return collect_facts(
+                os.path.join(managedinstalldir, CACHE_FILENAME),
+                **run_options)
+        finally:
+            if locked:
+                lock.release()
+
+
+def collect_facts(cache_path, **run_options):
+    '''Runs the fact modules for collect() and main(), with the cache at
+    cache_path if it isn't None, and returns what run_facts() does. The
+    caller holds _collect_lock, and the CollectionLock if there is a
+    cache.'''
+    return run_facts(os.path.join(os.path.dirname(__file__), 'facts'),
+                     cache_path=cache_path, modules=_collected_modules,
+                     **run_options)
+
+
+def main():
+    '''Run all our fact plugins and collect their data'''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--workers', type=int, default=DEFAULT_WORKERS,
+        help='Maximum number of fact modules to run at the same time. '
+        'Use 1 to run them one after another. Defaults to %(default)s.')
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='Run every fact module, ignoring and not updating the cache of '
+        'fact results.')
+    parser.add_argument(
+        '--fact-timeout', type=float, default=DEFAULT_FACT_TIMEOUT,
+        help='Seconds a fact module may run if it doesn\'t set its own '
+        'TIMEOUT. Defaults to %(default)s.')
+    parser.add_argument(
+        '--timeout', type=float, default=DEFAULT_RUN_TIMEOUT,
+        help='Seconds all the fact modules together may run. Results from '
+        'modules that finished in time are still saved. Defaults to '
+        '%(default)s.')
+    parser.add_argument(
+        '--managed-install-dir', metavar='DIR',
+        help='Munki\'s ManagedInstallDir. Defaults to $%s, then to the '
+        'ManagedInstallDir in Munki\'s preferences.' % MANAGED_INSTALL_DIR_ENV)
+    parser.add_argument(
+        '--binary-plist', action='store_true',
+        help='Write ConditionalItems.plist as a binary plist, which is '
+        'smaller and faster to read and write than XML.')
+    parser.add_argument(
+        '--agent', action='store_true',
+        help='Run as a resident agent that keeps the fact modules loaded, '
+        'runs them every --interval seconds and whenever a client asks, and '
+        'answers clients on --socket. When an agent is running, '
+        'munki_facts.py gets its facts from the agent and only writes '
+        'ConditionalItems.plist.')
+    parser.add_argument(
+        '--socket', default=DEFAULT_SOCKET_PATH,
+        help='The agent\'s socket. Defaults to %(default)s.')
+    parser.add_argument(
+        '--interval', type=float, default=DEFAULT_AGENT_INTERVAL,
+        help='Seconds between the agent\'s scheduled runs. Defaults to '
+        '%(default)s.')
+    parser.add_argument(
+        '--max-age', type=float, default=0,
+        help='Accept facts from the agent up to this many seconds old. '
+        'Defaults to 0, which makes the agent run the fact modules again.')
+    parser.add_argument(
+        '--no-agent', action='store_true',
+        help='Run the fact modules in this process even if an agent is '
+        'running.')
+    parser.add_argument(
+        '--isolate', action='store_true',
+        help='Run each fact module in a worker process, so one that crashes '
+        'or uses too much memory doesn\'t affect the others.')
+    parser.add_argument(
+        '--worker-max-tasks', type=int, default=DEFAULT_WORKER_MAX_TASKS,
+        help='With --isolate, replace a worker process after it has run this '
+        'many fact modules. Defaults to %(default)s.')
+    parser.add_argument(
+        '--worker-max-rss', type=int, metavar='MB',
+        default=DEFAULT_WORKER_MAX_RSS // (1024 * 1024),
+        help='With --isolate, replace a worker process once its peak memory '
+        'use passes this many megabytes. Defaults to %(default)s.')
+    parser.add_argument(
+        '--budget', type=float, metavar='SECONDS',
+        help='Take no more than SECONDS. Fact modules whose results are '
+        'oldest are run first, and the rest keep their results from earlier '
+        'runs.')
+    parser.add_argument(
+        '--stats', action='store_true',
+        help='Show how long each fact module has taken in recent runs, '
+        'slowest first, and exit.')
+    parser.add_argument(
+        '--circuits', action='store_true',
+        help='List the fact modules being skipped because they have failed '
+        'too many runs in a row, and when each will be tried again, and '
+        'exit.')
+    parser.add_argument(
+        '--metrics', metavar='DIR',
+        help='Write the status, run time, CPU time and command resource usage '
+        'of each fact module to DIR as %s and as a Prometheus textfile, %s.'
+        % (METRICS_JSON_FILENAME, METRICS_PROM_FILENAME))
+    options = parser.parse_args()
+    if options.workers < 1:
+        parser.error('--workers must be 1 or greater')
+    if options.fact_timeout <= 0 or options.timeout <= 0:
+        parser.error('timeouts must be greater than 0')
+    if options.interval <= 0:
+        parser.error('--interval must be greater than 0')
+    if options.worker_max_tasks < 1 or options.worker_max_rss < 1:
+        parser.error('--worker-max-tasks and --worker-max-rss must be 1 or '
+                     'greater')
+    if options.budget is not None:
+        if options.budget <= 0:
+            parser.error('--budget must be greater than 0')
+        if options.no_cache:
+            parser.error('--budget needs the cache of earlier results')
+
+    managedinstalldir = get_managed_install_dir(options.managed_install_dir)
+    cache_path = None
+    if not options.no_cache:
+        cache_path = os.path.join(managedinstalldir, CACHE_FILENAME)
+    module_dir = os.path.join(os.path.dirname(__file__), 'facts')
+    if options.stats:
+        print(format_stats(load_cache(
+            os.path.join(managedinstalldir, CACHE_FILENAME))['history']))
+        return 0
+    if options.circuits:
+        print(format_circuits(load_cache(
+            os.path.join(managedinstalldir, CACHE_FILENAME))['failures'],
+                              module_dir))
+        return 0
+    run_options = {'workers': options.workers, 'cache_path': cache_path,
+                   'fact_timeout': options.fact_timeout,
+                   'timeout': options.timeout}
+
+    def start_pool():
+        '''Returns a WorkerPool if --isolate was given'''
+        if not options.isolate:
+            return None
+        return WorkerPool(options.workers, options.worker_max_tasks,
+                          options.worker_max_rss * 1024 * 1024)
+
+    if options.agent:
+        # exit cleanly, removing the socket, when launchd stops the agent
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        pool = start_pool()
+        try:
+            FactsAgent(module_dir, pool=pool, **run_options).serve(
+                options.socket, options.interval)
+        finally:
+            if pool:
+                pool.close()
+        return 0
+
+    start = time.perf_counter()
+    # one collection at a time; those that start while another is running
+    # wait for it and use what it collected
+    lock = CollectionLock(os.path.join(managedinstalldir, LOCK_FILENAME))
+    waiting_since = time.time()
+    locked = lock.take(options.budget or options.timeout + AGENT_REPLY_SLACK)
+    try:
+        facts = None
+        if locked:
+            last = lock.last_collection(waiting_since - options.max_age)
+            if last:
+                facts, status, run_seconds = last
+        collected = facts is None
+        if collected and not options.no_agent:
+            try:
+                facts, status, run_seconds = request_facts(
+                    options.socket, options.max_age,
+                    # the budget is a hard limit, so don't wait any longer
+                    options.budget or options.timeout + AGENT_REPLY_SLACK,
+                    options.budget, locked)
+            except (OSError, ValueError, ExpatError):
+                # no agent, or it couldn't answer; run the modules here
+                facts = None
+        if facts is None:
+            budget = options.budget
+            if budget is not None:
+                # whatever waiting for the lock and the agent left of it;
+                # with none left, the earlier results are all served
+                budget = max(budget - (time.perf_counter() - start), 0.001)
+            start = time.perf_counter()
+            pool = start_pool()
+            try:
+                with _collect_lock:
+                    # this process holds the CollectionLock already
+                    facts, status = collect_facts(
+                        cache_path, workers=options.workers,
+                        fact_timeout=options.fact_timeout,
+                        timeout=options.timeout, budget=budget, pool=pool)
+            finally:
+                if pool:
+                    pool.close()
+            run_seconds = time.perf_counter() - start
+        if options.metrics:
+            write_metrics(options.metrics, status, run_seconds)
+
+        if facts:
+            conditionalitemspath = os.path.join(
+                managedinstalldir, 'ConditionalItems.plist')
+            try:
+                write_conditional_items(
+                    conditionalitemspath, facts, binary=options.binary_plist)
+            except (IOError, OSError, TypeError, OverflowError) as err:
+                print('Couldn\'t save conditional items: %s' % err,
+                      file=sys.stderr)
+        if locked and collected:
+            lock.record(facts, status, run_seconds)
+    finally:
+        if locked:
+            lock.release()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+'''Compiles facts/_releases.py into facts/_releases.index, the compact binary
+index that macos_upgrade_supported loads at startup.
+
+Supported models and board-ids for a release can be read straight from the
+plists in its installer instead of being pasted in by hand:
+
+    build_release_index.py \\
+        --restore-plist sequoia=/path/to/AssetData/boot/Restore.plist \\
+        --platform-support \\
+            sequoia=/path/to/AssetData/boot/PlatformSupport.plist \\
+        --write-table
+
+replaces the models of the 'sequoia' release with the combined
+SupportedProductTypes and SupportedModelProperties values, replaces its
+board-ids with the SupportedBoardIds values, rewrites facts/_releases.py so the
+change can be reviewed as a diff, and rebuilds the index. The release itself
+(name, version and Darwin limits) must already be in facts/_releases.py.
+
+Index format (all integers little-endian):
+
+    header      magic b'MFRI', format version (u16), release count (u16),
+                key count (u32), version mask count (u32)
+    masks       match_all, match_any, and the releases that list models,
+                board_ids and device_ids (5 x u64)
+    releases    per release: min Darwin version (u8), max Darwin version (u8),
+                name length (u8), name (UTF-8)
+    versions    mask of releases installable over each Darwin version (u64)
+    keys        per key, sorted by (kind, key): kind (u8), pad, key length
+                (u16), offset into the string table (u32), release mask (u64)
+    strings     the UTF-8 bytes of every key
+'''
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import ast
+import os
+import plistlib
+import pprint
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+# pylint: disable=wrong-import-position
+from facts import _eligibility
+# pylint: enable=wrong-import-position
+
+TABLE_PATH = os.path.join(REPO_DIR, 'facts', '_releases.py')
+TABLE_KEYS = ['name', 'version', 'min_darwin', 'max_darwin', 'match',
+              'models', 'unsupported_models', 'board_ids', 'device_ids']
+
+
+def load_table(path):
+    '''Returns the docstring source and the RELEASES list of a release
+    table module'''
+    with open(path) as file:
+        source = file.read()
+    tree = ast.parse(source)
+    docstring_end = tree.body[0].end_lineno
+    docstring = '\n'.join(source.splitlines()[:docstring_end])
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and
+                node.targets[0].id == 'RELEASES'):
+            return docstring, ast.literal_eval(node.value)
+    raise ValueError('No RELEASES in %s' % path)
+
+
+def format_table(docstring, releases):
+    '''Returns the source of a release table module'''
+    lines = [docstring, '', 'RELEASES = [']
+    for release in releases:
+        lines.append('    {')
+        for key in TABLE_KEYS + sorted(set(release) - set(TABLE_KEYS)):
+            if key not in release:
+                continue
+            value = release[key]
+            if isinstance(value, (list, tuple)):
+                lines.append('        %r: [' % key)
+                lines.extend('            %r,' % item
+                             for item in sorted(set(value)))
+                lines.append('        ],')
+            else:
+                lines.append('        %r: %s,' % (key, pprint.pformat(value)))
+        lines.append('    },')
+    lines.append(']')
+    return '\n'.join(lines) + '\n'
+
+
+def read_plist(path):
+    '''Returns the contents of a plist file'''
+    with open(path, 'rb') as file:
+        return plistlib.load(file)
+
+
+def parse_assignments(values, option):
+    '''Splits NAME=PATH command line values into a dict'''
+    assignments = {}
+    for value in values or []:
+        name, sep, path = value.partition('=')
+        if not sep or not name or not path:
+            raise SystemExit('%s needs NAME=PATH, not %r' % (option, value))
+        assignments.setdefault(name, []).append(path)
+    return assignments
+
+
+def apply_installer_plists(releases, restore_plists, platform_plists):
+    '''Replaces the models and board-ids of releases with the values from
+    their installers' Restore.plist and PlatformSupport.plist files'''
+    by_name = dict((release['name'], release) for release in releases)
+    for name in set(restore_plists) | set(platform_plists):
+        if name not in by_name:
+            raise SystemExit('No release named %r in %s; add it first'
+                             % (name, TABLE_PATH))
+        models = set()
+        board_ids = set()
+        for path in restore_plists.get(name, []):
+            models.update(read_plist(path).get('SupportedProductTypes', []))
+        for path in platform_plists.get(name, []):
+            plist = read_plist(path)
+            models.update(plist.get('SupportedModelProperties', []))
+            board_ids.update(plist.get('SupportedBoardIds', []))
+        if models:
+            by_name[name]['models'] = sorted(models)
+        if board_ids:
+            by_name[name]['board_ids'] = sorted(board_ids)
+
+
+def compile_index(releases):
+    '''Returns the binary index for a list of releases'''
+    # the in-memory index already works out every mask we need to store
+    index = _eligibility.ReleaseIndex(releases)
+    if len(index.names) > 64:
+        raise SystemExit('The index format holds at most 64 releases')
+
+    keys = []
+    for kind, code in _eligibility.KIND_CODES.items():
+        for key, mask in index.masks[kind].items():
+            keys.append((code, key.encode('utf-8'), mask))
+    keys.sort()
+
+    data = [_eligibility.HEADER.pack(
+        _eligibility.INDEX_MAGIC, _eligibility.INDEX_FORMAT_VERSION,
+        len(releases), len(keys), len(index.version_masks))]
+    data.append(_eligibility.MASKS.pack(
+        index.match_all, index.match_any, index.listed['models'],
+        index.listed['board_ids'], index.listed['device_ids']))
+    for release in releases:
+        name = release['name'].encode('utf-8')
+        data.append(_eligibility.RELEASE.pack(
+            release.get('min_darwin', 0), release['max_darwin'], len(name)))
+        data.append(name)
+    data.extend(_eligibility.MASK.pack(mask) for mask in index.version_masks)
+    offset = 0
+    for code, key, mask in keys:
+        data.append(_eligibility.KEY.pack(code, len(key), offset, mask))
+        offset += len(key)
+    data.extend(key for _, key, _ in keys)
+    return b''.join(data)
+
+
+def dump_index(path):
+    '''Prints the contents of an index file as sorted text, one key per
+    line, for comparing index files'''
+    index = _eligibility.load_index(path)
+    if index is None:
+        raise SystemExit('%s is not a valid release index' % path)
+    print('releases: %s' % ', '.join(index.names))
+    for kind, key, mask in index.keys():
+        releases = [name for bit, name in enumerate(index.names)
+                    if mask & (1 << bit)]
+        print('%s %s: %s' % (kind, key, ', '.join(releases)))
+
+
+def main():
+    '''Compile the release index'''
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '--restore-plist', action='append', metavar='NAME=PATH',
+        help='Restore.plist from the installer of release NAME')
+    parser.add_argument(
+        '--platform-support', action='append', metavar='NAME=PATH',
+        help='PlatformSupport.plist from the installer of release NAME')
+    parser.add_argument(
+        '--write-table', action='store_true',
+        help='Rewrite facts/_releases.py with the updated releases')
+    parser.add_argument(
+        '--output', default=_eligibility.INDEX_PATH,
+        help='Where to write the index. Defaults to %(default)s')
+    parser.add_argument(
+        '--check', action='store_true',
+        help="Don't write anything; exit with status 1 if the index is out of "
+        'date')
+    parser.add_argument(
+        '--dump', metavar='PATH',
+        help='Print the contents of an index file and exit')
+    options = parser.parse_args()
+
+    if options.dump:
+        dump_index(options.dump)
+        return 0
+
+    docstring, releases = load_table(TABLE_PATH)
+    apply_installer_plists(
+        releases,
+        parse_assignments(options.restore_plist, '--restore-plist'),
+        parse_assignments(options.platform_support, '--platform-support'))
+    data = compile_index(releases)
+
+    if options.check:
+        try:
+            with open(options.output, 'rb') as file:
+                current = file.read()
+        except (IOError, OSError):
+            current = None
+        if current != data:
+            print('%s is out of date; run %s' % (options.output, sys.argv[0]),
+                  file=sys.stderr)
+            return 1
+        return 0
+
+    if options.write_table:
+        with open(TABLE_PATH, 'w') as file:
+            file.write(format_table(docstring, releases))
+    with open(options.output, 'wb') as file:
+        file.write(data)
+    print('Wrote %s (%s releases, %s bytes)'
+          % (options.output, len(releases), len(data)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())